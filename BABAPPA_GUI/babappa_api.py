@@ -1,18 +1,28 @@
 import os
+import errno
 import shutil
 import uuid
 import subprocess
-import time
 import platform
 import re
 import sys
 import threading
+import asyncio
+from collections import deque
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
 
+try:
+    from watchfiles import awatch  # inotify-backed on Linux
+except ImportError:  # fall back to polling the logs folder
+    awatch = None
+
 app = FastAPI()
 RUN_STATUS = {}
+# Per-job history kept in memory; the full output stays in the job's log files
+MAX_STATUS_LOGS = 2000
+MAX_STATUS_STEPS = 500
 
 @app.get("/")
 def health_check():
@@ -27,16 +37,22 @@ MODELS = {
 }
 ALLOWED_FILES = {".py", ".ctl"}
 
-STEP_PATTERNS = [
-    (re.compile(r"\bSTEP\s*[:\-]?\s*(\d+)\b", re.I),
-     lambda m: {"type": "step", "id": int(m.group(1))}),
-    (re.compile(r"\b(prank|codeml)\b.*\b(finished|completed|done)\b", re.I),
-     lambda m: {"type": "tool_done", "tool": m.group(1).lower()}),
-    (re.compile(r"\b(finished|completed|done)\b", re.I),
-     lambda m: {"type": "completed"}),
-    (re.compile(r"\bERROR\b", re.I),
-     lambda m: {"type": "error"}),
-]
+# All step patterns in one regex, tried in priority order. Each alternative is a
+# lookahead anchored at the start, so the first pattern found anywhere in the line
+# wins (as with searching them one by one); lastgroup names the alternative.
+STEP_RE = re.compile(
+    r"(?=.*?(?P<step>\bSTEP\s*[:\-]?\s*(?P<step_id>\d+)\b))"
+    r"|(?=.*?(?P<tool_done>\b(?P<tool>prank|codeml)\b.*\b(?:finished|completed|done)\b))"
+    r"|(?=.*?(?P<completed>\b(?:finished|completed|done)\b))"
+    r"|(?=.*?(?P<error>\bERROR\b))",
+    re.I,
+)
+STEP_EVENTS = {
+    "step": lambda m: {"type": "step", "id": int(m.group("step_id"))},
+    "tool_done": lambda m: {"type": "tool_done", "tool": m.group("tool").lower()},
+    "completed": lambda m: {"type": "completed"},
+    "error": lambda m: {"type": "error"},
+}
 
 
 def windows_to_wsl_path(p: str) -> Path:
@@ -61,7 +77,13 @@ def move_generated_subfolders(model_folder: Path, destination: Path):
     destination.mkdir(parents=True, exist_ok=True)
     for item in list(model_folder.iterdir()):
         if item.is_dir():
-            shutil.move(str(item), str(destination / item.name))
+            target = destination / item.name
+            try:
+                os.rename(item, target)  # metadata-only on the same filesystem
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(str(item), str(target))
 
 
 def clean_model_folder(model_folder: Path):
@@ -72,6 +94,16 @@ def clean_model_folder(model_folder: Path):
             item.unlink()
 
 
+async def watch_logs(logs_dir: Path):
+    """Yield the set of changed paths in logs_dir, or an empty set after ~1s of quiet."""
+    if awatch is None:
+        while True:
+            await asyncio.sleep(0.2)
+            yield set()
+    async for changes in awatch(logs_dir, rust_timeout=1000, yield_on_timeout=True):
+        yield {Path(p) for _, p in changes}
+
+
 @app.post("/run")
 async def run_model(
     model: str = Form(...),
@@ -85,7 +117,12 @@ async def run_model(
         )
 
     job_id = str(uuid.uuid4())
-    RUN_STATUS[job_id] = {"status": "running", "logs": [], "model": model}
+    RUN_STATUS[job_id] = {
+        "status": "running",
+        "logs": deque(maxlen=MAX_STATUS_LOGS),
+        "steps": deque(maxlen=MAX_STATUS_STEPS),
+        "model": model,
+    }
 
     output_folder = windows_to_wsl_path(output_folder)
     model_path = MODELS[model]
@@ -95,8 +132,9 @@ async def run_model(
     job_log = logs_dir / f"{job_id}.log"
 
     fasta_path = model_folder / fasta_file.filename
+    # Copy the spooled upload to disk in 1 MiB chunks rather than reading it all into memory
     with open(fasta_path, "wb") as f:
-        f.write(await fasta_file.read())
+        shutil.copyfileobj(fasta_file.file, f, length=1024 * 1024)
 
     def run_script():
         try:
@@ -104,15 +142,14 @@ async def run_model(
                 lf.write(f"--- Job {job_id} started for model {model} ---\n")
 
             with open(job_log, "a", encoding="utf-8") as lf:
-                process = subprocess.Popen(
+                # No .pyc writes: keeps __pycache__ out of the model folder we clean afterwards
+                rc = subprocess.run(
                     [sys.executable, str(model_path)],   # ✅ no fasta arg
                     cwd=str(model_folder),
                     stdout=lf,
                     stderr=subprocess.STDOUT,
-                    text=True,
-                )
-                process.wait()
-                rc = process.returncode
+                    env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+                ).returncode
                 lf.write(f"\n--- Driver exited with code {rc} ---\n")
 
             if rc != 0:
@@ -177,11 +214,12 @@ def status(job_id: str):
             status_code=404,
             content={"status": "failed", "logs": ["Job ID not found"]}
         )
-    return RUN_STATUS[job_id]
+    job = RUN_STATUS[job_id]
+    return {**job, "logs": list(job["logs"]), "steps": list(job["steps"])}
 
 
 @app.get("/stream/{job_id}")
-def stream_logs(job_id: str):
+async def stream_logs(job_id: str):
     if job_id not in RUN_STATUS:
         return JSONResponse(
             status_code=404,
@@ -192,68 +230,77 @@ def stream_logs(job_id: str):
     logs_dir = MODELS[model].parent / "logs"
     logs_dir.mkdir(parents=True, exist_ok=True)
 
-    def event_generator():
-        file_positions = {}  # track file read offsets
+    async def event_generator():
+        handles = {}  # log file -> read handle, opened once and kept at its offset
 
-        while True:
-            # Pick up new log files dynamically
-            for log_file in sorted(logs_dir.glob("*.log")):
-                if log_file not in file_positions:
-                    file_positions[log_file] = 0
-
-            # Stream new lines from each log file
-            for log_file, pos in list(file_positions.items()):
+        def scan_logs():
+            # One scandir pass; entries carry their type, so no stat per file
+            try:
+                with os.scandir(logs_dir) as it:
+                    return [Path(e.path) for e in it if e.name.endswith(".log") and e.is_file()]
+            except FileNotFoundError:
+                # At job end logs/ is moved into the results folder; the handles
+                # already open still point at the moved files and are drained as usual
+                return []
+
+        def open_logs(paths):
+            for log_file in sorted(paths):
+                if log_file.suffix == ".log" and log_file not in handles and log_file.is_file():
+                    handles[log_file] = open(log_file, "r", encoding="utf-8", errors="replace")
+
+        def read_new_lines(paths=None):
+            # Only the files reported as changed, or every tracked file when paths is None
+            for log_file, fh in handles.items():
+                if paths is not None and log_file not in paths:
+                    continue
                 try:
-                    if not log_file.exists():
-                        continue
-                    with open(log_file, "r", encoding="utf-8", errors="replace") as fh:
-                        fh.seek(pos)
-                        for line in fh:
-                            content = line.rstrip("\r\n")
-                            # Prefix with filename so GUI knows source
-                            yield f"data: {log_file.name}: {content}\n\n"
-                            RUN_STATUS[job_id]["logs"].append(f"{log_file.name}: {content}")
-
-                            # Step detection
-                            for pattern, handler in STEP_PATTERNS:
-                                m = pattern.search(content)
-                                if m:
-                                    info = handler(m)
-                                    RUN_STATUS[job_id].setdefault("steps", []).append(
-                                        {"line": content, **info}
-                                    )
-                                    RUN_STATUS[job_id]["latest_step"] = {"line": content, **info}
-                                    break
-                        file_positions[log_file] = fh.tell()
+                    for line in fh:
+                        content = line.rstrip("\r\n")
+                        # Prefix with filename so GUI knows source
+                        yield f"data: {log_file.name}: {content}\n\n"
+                        RUN_STATUS[job_id]["logs"].append(f"{log_file.name}: {content}")
+
+                        # Step detection
+                        m = STEP_RE.match(content)
+                        if m:
+                            info = STEP_EVENTS[m.lastgroup](m)
+                            RUN_STATUS[job_id]["steps"].append(
+                                {"line": content, **info}
+                            )
+                            RUN_STATUS[job_id]["latest_step"] = {"line": content, **info}
                 except Exception as e:
                     err_msg = f"ERROR reading {log_file.name}: {e}"
                     yield f"data: {err_msg}\n\n"
                     RUN_STATUS[job_id]["logs"].append(err_msg)
 
-            # End when job finishes
-            if RUN_STATUS[job_id]["status"] in ("finished", "failed"):
-                for log_file, pos in list(file_positions.items()):
-                    try:
-                        if not log_file.exists():
-                            continue
-                        with open(log_file, "r", encoding="utf-8", errors="replace") as fh:
-                            fh.seek(pos)
-                            for line in fh:
-                                content = line.rstrip("\r\n")
-                                yield f"data: {log_file.name}: {content}\n\n"
-                                RUN_STATUS[job_id]["logs"].append(f"{log_file.name}: {content}")
-                    except Exception:
-                        pass
-                #yield f"data: __status__: {RUN_STATUS[job_id]['status']}\n\n"
-                break
-
-            yield ": heartbeat\n\n"
-            time.sleep(0.2)
+        try:
+            open_logs(scan_logs())
+            for event in read_new_lines():
+                yield event
+
+            async for changed in watch_logs(logs_dir):
+                # Check status first so everything written before the job ended is read below
+                done = RUN_STATUS[job_id]["status"] in ("finished", "failed")
+
+                # Pick up new log files (rescan on a quiet tick or when the job ends)
+                # and read only the files that changed, draining all of them on those ticks
+                full_pass = done or not changed
+                open_logs(scan_logs() if full_pass else changed)
+                for event in read_new_lines(None if full_pass else changed):
+                    yield event
+
+                if done:
+                    #yield f"data: __status__: {RUN_STATUS[job_id]['status']}\n\n"
+                    break
+
+                yield ": heartbeat\n\n"
+        finally:
+            for fh in handles.values():
+                fh.close()
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
-
 if __name__ == "__main__":
     import uvicorn
     print(">>> Starting Babappa API on http://127.0.0.1:8000")
@@ -2,16 +2,42 @@
 
 import sys
 import threading
+from collections import deque
 import requests
+from requests.adapters import HTTPAdapter
 import subprocess, os, time, socket
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel,
-    QPushButton, QLineEdit, QFileDialog, QComboBox, QTextEdit, QHBoxLayout
+    QPushButton, QLineEdit, QFileDialog, QComboBox, QPlainTextEdit, QHBoxLayout
 )
-from PyQt6.QtGui import QIcon, QFont
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtGui import QIcon, QFont, QTextCursor
+from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot, QObject, QThread, QTimer, QSettings
+
+try:
+    from requests_toolbelt import MultipartEncoder  # streams uploads without buffering them
+except ImportError:
+    MultipartEncoder = None
 
 API_ROOT = "http://127.0.0.1:8000"
+LOG_MAX_LINES = 1000    # lines kept in the log area
+LOG_MAX_CHARS = 4096    # longer single messages are cropped
+LOG_FLUSH_MS = 100      # how often buffered log lines are drawn
+
+# One stylesheet for the whole window; later rules override the QWidget default
+STYLESHEET = """
+QWidget { background-color: #707070; color: #f0f0f0; }
+QLineEdit { background-color: #3c3c3c; color: #f0f0f0; }
+QComboBox { background-color: #3c3c3c; color: #f0f0f0; font-weight: bold; }
+QPlainTextEdit { background-color: #1e1e1e; color: #f0f0f0; }
+QPushButton#browse { background-color: #9c7503; color: white; font-weight: bold; }
+QPushButton#run { background-color: #1e9606; color: white; font-weight: bold; height: 35px; }
+QPushButton#clear { background-color: #960303; color: white; font-weight: bold; height: 35px; }
+"""
+
+
+def sse_data(line: str) -> str:
+    """Strip the SSE "data: " prefix from a stream line, if present."""
+    return line[6:] if line.startswith("data: ") else line
 
 
 def api_ready(host="127.0.0.1", port=8000, timeout=1):
@@ -64,6 +90,59 @@ def start_api_if_needed(log_cb):
     return False
 
 
+class AnalysisWorker(QObject):
+    """Submits one run to the API and streams its log lines back (runs in a QThread)."""
+    line = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, session, input_file, output_dir, model):
+        super().__init__()
+        self.session = session
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.model = model
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            with open(self.input_file, "rb") as f:
+                data = {"model": self.model, "output_folder": self.output_dir}
+                if MultipartEncoder is not None:
+                    m = MultipartEncoder(fields={
+                        **data,
+                        "fasta_file": (os.path.basename(self.input_file), f, "application/octet-stream"),
+                    })
+                    resp = self.session.post(f"{API_ROOT}/run", data=m,
+                                             headers={"Content-Type": m.content_type}, timeout=30)
+                else:
+                    files = {"fasta_file": f}
+                    resp = self.session.post(f"{API_ROOT}/run", files=files, data=data, timeout=30)
+
+            if not resp.ok:
+                self.line.emit(f"Submission failed: {resp.text}\n")
+                return
+
+            job_id = resp.json()["job_id"]
+            self.line.emit(f"Job submitted! Job ID: {job_id}\n")
+            self.line.emit("Streaming logs...\n")
+
+            with self.session.get(f"{API_ROOT}/stream/{job_id}", stream=True,
+                                  headers={"Accept": "text/event-stream"}) as r:
+                for line in r.iter_lines(chunk_size=65536, decode_unicode=True):
+                    if not line or line.startswith(":"):
+                        continue
+                    msg = sse_data(line)
+                    if msg.startswith("__status__:"):
+                        self.line.emit(f"--- Final Status: {msg[len('__status__:'):].strip()} ---\n")
+                        break
+                    self.line.emit(msg)
+
+        except Exception as e:
+            self.line.emit(f"Error: {e}\n")
+        finally:
+            self.finished.emit()
+
+
 class BabappaGUI(QWidget):
     log_signal = pyqtSignal(str)
 
@@ -72,11 +151,29 @@ class BabappaGUI(QWidget):
         self.setWindowTitle("BABAPPA GUI")
         self.setWindowIcon(QIcon("butterfly_icon.ico"))
         self.setGeometry(400, 150, 650, 500)
-        self.setStyleSheet("background-color: #707070; color: #f0f0f0;")
+        self.setStyleSheet(STYLESHEET)
+
+        # Remembers the last input/output folders between sessions
+        self.settings = QSettings("Babappa", "GUI")
+
+        # One keep-alive connection pool to the local API for all requests
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        # Log lines are buffered and drawn in batches by a timer
+        self._log_buf = deque()
+        self._log_lock = threading.Lock()
+
+        self._jobs = []  # (QThread, AnalysisWorker) pairs still running
 
         self.initUI()
         self.log_signal.connect(self.safe_append_log)
 
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(LOG_FLUSH_MS)
+        self._log_timer.timeout.connect(self._flush_logs)
+        self._log_timer.start()
+
         # --- Start API automatically in a background thread ---
         threading.Thread(
             target=lambda: start_api_if_needed(self.log_signal.emit),
@@ -96,10 +193,9 @@ class BabappaGUI(QWidget):
         self.input_line = QLineEdit()
         self.input_line.setPlaceholderText("Select input FASTA file")
         self.input_line.setReadOnly(True)
-        self.input_line.setStyleSheet("background-color: #3c3c3c; color: #f0f0f0;")
 
         btn_input = QPushButton("Browse")
-        btn_input.setStyleSheet("background-color: #9c7503; color: white; font-weight: bold;")
+        btn_input.setObjectName("browse")
         btn_input.setFixedWidth(80)
         btn_input.clicked.connect(self.select_input_file)
 
@@ -112,10 +208,9 @@ class BabappaGUI(QWidget):
         self.output_line = QLineEdit()
         self.output_line.setPlaceholderText("Select output folder")
         self.output_line.setReadOnly(True)
-        self.output_line.setStyleSheet("background-color: #3c3c3c; color: #f0f0f0;")
 
         btn_output = QPushButton("Browse")
-        btn_output.setStyleSheet("background-color: #9c7503; color: white; font-weight: bold;")
+        btn_output.setObjectName("browse")
         btn_output.setFixedWidth(80)
         btn_output.clicked.connect(self.select_output_folder)
 
@@ -127,17 +222,16 @@ class BabappaGUI(QWidget):
         # Model selection
         self.model_combo = QComboBox()
         self.model_combo.addItems(["clip", "clipgard", "normal"])
-        self.model_combo.setStyleSheet("background-color: #3c3c3c; color: #f0f0f0; font-weight: bold;")
         self.model_combo.setFixedWidth(120)
 
         # Run + Clear buttons
         btn_run = QPushButton("Run Analysis")
-        btn_run.setStyleSheet("background-color: #1e9606; color: white; font-weight: bold; height: 35px;")
+        btn_run.setObjectName("run")
         btn_run.setFixedWidth(120)
         btn_run.clicked.connect(self.run_analysis)
 
         btn_clear = QPushButton("Clear Session")
-        btn_clear.setStyleSheet("background-color: #960303; color: white; font-weight: bold; height: 35px;")
+        btn_clear.setObjectName("clear")
         btn_clear.setFixedWidth(120)
         btn_clear.clicked.connect(self.clear_session)
 
@@ -152,33 +246,70 @@ class BabappaGUI(QWidget):
         layout.addLayout(action_layout)
 
         # Log area
-        self.log_area = QTextEdit()
+        self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
-        self.log_area.setStyleSheet("background-color: #1e1e1e; color: #f0f0f0;")
+        self.log_area.setMaximumBlockCount(LOG_MAX_LINES)  # oldest lines are dropped automatically
         layout.addWidget(self.log_area)
+        # Cursor on the document itself, so appends skip the widget's append() path
+        self._log_cursor = QTextCursor(self.log_area.document())
 
         self.setLayout(layout)
 
     def safe_append_log(self, text: str):
-        self.log_area.append(text)
-        self.log_area.verticalScrollBar().setValue(self.log_area.verticalScrollBar().maximum())
+        if len(text) > LOG_MAX_CHARS:
+            text = text[:LOG_MAX_CHARS] + " ...[truncated]"
+        with self._log_lock:
+            self._log_buf.append(text)
+
+    def _flush_logs(self):
+        """Draw all buffered log lines with a single append."""
+        with self._log_lock:
+            if not self._log_buf:
+                return
+            batch = "\n".join(self._log_buf)
+            self._log_buf.clear()
+        # Only follow the log if the user has not scrolled up to read it
+        sb = self.log_area.verticalScrollBar()
+        at_bottom = sb.value() >= sb.maximum() - 4
+
+        # Suspend repaints so the insert and scroll cost one repaint per batch
+        self.log_area.setUpdatesEnabled(False)
+        try:
+            cursor = self._log_cursor
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            if not self.log_area.document().isEmpty():
+                cursor.insertBlock()
+            cursor.insertText(batch)
+
+            if at_bottom:
+                sb.setValue(sb.maximum())
+        finally:
+            self.log_area.setUpdatesEnabled(True)
+            self.log_area.viewport().update()
 
     def select_input_file(self):
         file_name, _ = QFileDialog.getOpenFileName(
-            self, "Select FASTA file", "", "FASTA Files (*.fasta *.fa *.fna)"
+            self, "Select FASTA file", self.settings.value("last_input_dir", ""),
+            "FASTA Files (*.fasta *.fa *.fna)"
         )
         if file_name:
             self.input_line.setText(file_name)
+            self.settings.setValue("last_input_dir", os.path.dirname(file_name))
 
     def select_output_folder(self):
-        folder = QFileDialog.getExistingDirectory(self, "Select Output Folder")
+        folder = QFileDialog.getExistingDirectory(
+            self, "Select Output Folder", self.settings.value("last_output_dir", "")
+        )
         if folder:
             self.output_line.setText(folder)
+            self.settings.setValue("last_output_dir", folder)
 
     def clear_session(self):
         self.input_line.clear()
         self.output_line.clear()
         self.model_combo.setCurrentIndex(0)
+        with self._log_lock:
+            self._log_buf.clear()
         self.log_area.clear()
         self.log_signal.emit("Session cleared. Ready for next job.\n")
 
@@ -193,35 +324,30 @@ class BabappaGUI(QWidget):
 
         self.log_signal.emit(f"Submitting {model} run...\n")
 
-        def worker():
-            try:
-                with open(input_file, "rb") as f:
-                    files = {"fasta_file": f}
-                    data = {"model": model, "output_folder": output_dir}
-                    resp = requests.post(f"{API_ROOT}/run", files=files, data=data, timeout=30)
-
-                if not resp.ok:
-                    self.log_signal.emit(f"Submission failed: {resp.text}\n")
-                    return
-
-                job_id = resp.json()["job_id"]
-                self.log_signal.emit(f"Job submitted! Job ID: {job_id}\n")
-                self.log_signal.emit("Streaming logs...\n")
-
-                with requests.get(f"{API_ROOT}/stream/{job_id}", stream=True) as r:
-                    for line in r.iter_lines(decode_unicode=True):
-                        if not line or line.startswith(":"):
-                            continue
-                        msg = line.replace("data: ", "")
-                        if msg.startswith("__status__"):
-                            self.log_signal.emit(f"--- Final Status: {msg.split(':',1)[1].strip()} ---\n")
-                            break
-                        self.log_signal.emit(msg)
-
-            except Exception as e:
-                self.log_signal.emit(f"Error: {e}\n")
-
-        threading.Thread(target=worker, daemon=True).start()
+        thread = QThread(self)
+        worker = AnalysisWorker(self.session, input_file, output_dir, model)
+        worker.moveToThread(thread)
+
+        # The log buffer is lock-protected, so lines are pushed straight from the
+        # worker thread instead of queueing one GUI event per line
+        worker.line.connect(self.safe_append_log, Qt.ConnectionType.DirectConnection)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+
+        job = (thread, worker)
+        self._jobs.append(job)  # keep Python references alive until the thread ends
+        thread.finished.connect(lambda: self._jobs.remove(job))
+        thread.start()
+
+    def closeEvent(self, event):
+        # Drop the API connections so running workers leave their stream loop, then join them
+        self.session.close()
+        for thread, _ in list(self._jobs):
+            thread.quit()
+            thread.wait(2000)
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -11,22 +11,22 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable across Windows/Linux)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+# Aligners are CPU-heavy and may start their own threads; pin each one to a
+# single thread so that running them side by side does not oversubscribe cores.
+SINGLE_THREAD_ENV = {**os.environ, "OMP_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
 
 
 # ------------------ Helpers ------------------ #
-def run_command(cmd, logfile=None):
-    """Run a shell command, optionally saving stdout/stderr to a log file."""
+def run_command(cmd, logfile=None, env=None):
+    """Run a command (argv list, no shell), optionally saving stdout/stderr to a log file."""
     try:
         if logfile:
             with open(logfile, "w", encoding="utf-8") as log:
-                subprocess.run(cmd, shell=True, check=True, stdout=log, stderr=subprocess.STDOUT)
+                subprocess.run(cmd, check=True, stdout=log, stderr=subprocess.STDOUT, env=env)
         else:
-            subprocess.run(cmd, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Command failed: {cmd}\n{e}")
+            subprocess.run(cmd, check=True, env=env)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"[ERROR] Command failed: {' '.join(cmd)}\n{e}")
         return False
     return True
 
@@ -36,7 +36,7 @@ def run_qc(file):
     output_file = os.path.join("QCseq", os.path.splitext(os.path.basename(file))[0] + "_QC.fasta")
     print(f"Running QC on {file}...")
     # use current python interpreter, not hard-coded "python3"
-    ok = run_command(f"\"{sys.executable}\" seqQC.py {file} {output_file}")
+    ok = run_command([sys.executable, "seqQC.py", file, output_file])
     if ok:
         print(f"QC Passed: {file} -> {output_file}")
     else:
@@ -49,7 +49,7 @@ def run_prank(file):
     prefix = os.path.join("msa", os.path.splitext(os.path.basename(file))[0] + "_msa")
     log_file = prefix + ".log"
     print(f"Running PRANK on {file}...")
-    run_command(f"prank -d={file} -o={prefix} -codon", logfile=log_file)
+    run_command(["prank", f"-d={file}", f"-o={prefix}", "-codon"], logfile=log_file, env=SINGLE_THREAD_ENV)
     return prefix + ".best.fas"
 
 
@@ -59,7 +59,7 @@ def run_clipkit(file):
     log_file = file.replace(".best.fas", "_clipkit.log")
 
     print(f"Trimming MSA with ClipKit smart-gap codon model: {file}")
-    run_command(f"clipkit {file} -m smart-gap --codon -o {tmp_output}", logfile=log_file)
+    run_command(["clipkit", file, "-m", "smart-gap", "--codon", "-o", tmp_output], logfile=log_file, env=SINGLE_THREAD_ENV)
 
     os.replace(tmp_output, file)
     print(f"ClipKit log saved to: {log_file}")
@@ -69,7 +69,7 @@ def run_clipkit(file):
 # ------------------ Stop/N Masking ------------------ #
 def run_mask(file):
     print(f"Masking internal stop/ambiguous codons: {file}")
-    ok = run_command(f"\"{sys.executable}\" babappa_stopcodon_masker.py {file} {file}")
+    ok = run_command([sys.executable, "babappa_stopcodon_masker.py", file, file])
     if not ok:
         print(f"Stop/N Masking failed for {file}")
     return file
@@ -86,8 +86,10 @@ def main():
         return
 
     parallel_jobs = multiprocessing.cpu_count()
+    aligner_jobs = max(1, parallel_jobs // 2)
     # ASCII arrow -> avoids UnicodeEncodeError on Windows
-    print(f"Detected {parallel_jobs} CPU cores -> running jobs in parallel.")
+    print(f"Detected {parallel_jobs} CPU cores -> running jobs in parallel "
+          f"({aligner_jobs} for PRANK/ClipKit).")
 
     # Step 1: QC
     with ThreadPoolExecutor(max_workers=parallel_jobs) as exe:
@@ -96,13 +98,13 @@ def main():
     print("QC Step Completed.")
 
     # Step 2: PRANK
-    with ThreadPoolExecutor(max_workers=parallel_jobs) as exe:
+    with ThreadPoolExecutor(max_workers=aligner_jobs) as exe:
         prank_results = list(exe.map(run_prank, qc_files))
     prank_files = [f for f in prank_results if os.path.exists(f)]
     print("MSA Step Completed.")
 
     # Step 3: ClipKit
-    with ThreadPoolExecutor(max_workers=parallel_jobs) as exe:
+    with ThreadPoolExecutor(max_workers=aligner_jobs) as exe:
         list(exe.map(run_clipkit, prank_files))
     print("ClipKit trimming completed. Trimmed MSAs and logs are ready in msa/")
 
@@ -115,4 +117,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable across Windows/Linux) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
     main()
@@ -12,14 +12,16 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+# Treefiles are read-only inputs downstream, so a hardlink is as good as a copy
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
 
-# ------------------ Setup Output Directories ------------------------------
-os.makedirs("iqtreeoutput", exist_ok=True)
-os.makedirs("treefiles", exist_ok=True)
-os.makedirs("foregroundbranch", exist_ok=True)
 
 # ------------------ Automatic Parallel Job Selection ----------------------
 TOTAL_CORES = multiprocessing.cpu_count()
@@ -27,14 +29,8 @@ TOTAL_CORES = multiprocessing.cpu_count()
 PARALLEL_IQTREE_JOBS = max(1, TOTAL_CORES - 2)
 PARALLEL_JOBS = max(1, TOTAL_CORES - 2)
 
-print(f"Detected {TOTAL_CORES} CPU cores → using {PARALLEL_IQTREE_JOBS} IQ-TREE jobs and {PARALLEL_JOBS} foreground jobs.")
 
 # ------------------ IQ-TREE2 Section --------------------------------------
-msa_files = glob.glob("msa/*_msa.best.fas")
-if not msa_files:
-    print("No MSA files found for IQ-TREE2. Skipping phylogenetic analysis.")
-    exit(1)
-
 def run_iqtree(file: str):
     gene_name = os.path.basename(file).replace("_msa.best.fas", "")
     output_folder = os.path.join("iqtreeoutput", gene_name)
@@ -59,20 +55,8 @@ def run_iqtree(file: str):
     except subprocess.CalledProcessError:
         print(f"❌ IQ-TREE2 failed: {file}")
 
-with ThreadPoolExecutor(max_workers=PARALLEL_IQTREE_JOBS) as exe:
-    list(exe.map(run_iqtree, msa_files))
-
-print("✅ IQ-TREE2 Step Completed.")
-
-# ------------------ Tree File Collection Section --------------------------
-for treefile in glob.glob("iqtreeoutput/**/*.treefile", recursive=True):
-    shutil.copy(treefile, "treefiles")
-
-print("All tree files copied to treefiles/.")
 
 # ------------------ Foreground Branch Selection Section --------------------
-tree_files = glob.glob("treefiles/*.treefile")
-
 def run_foreground_branch(treefile: str):
     gene_name = os.path.basename(treefile).replace(".treefile", "")
     output_folder = os.path.join("foregroundbranch", gene_name)
@@ -85,7 +69,41 @@ def run_foreground_branch(treefile: str):
     except subprocess.CalledProcessError:
         print(f"❌ Foreground branch selection failed: {treefile}")
 
-with ThreadPoolExecutor(max_workers=PARALLEL_JOBS) as exe:
-    list(exe.map(run_foreground_branch, tree_files))
 
-print("✅ Foreground Branch Selection Completed.")
+def main():
+    # ------------------ Setup Output Directories --------------------------
+    os.makedirs("iqtreeoutput", exist_ok=True)
+    os.makedirs("treefiles", exist_ok=True)
+    os.makedirs("foregroundbranch", exist_ok=True)
+
+    print(f"Detected {TOTAL_CORES} CPU cores → using {PARALLEL_IQTREE_JOBS} IQ-TREE jobs and {PARALLEL_JOBS} foreground jobs.")
+
+    msa_files = glob.glob("msa/*_msa.best.fas")
+    if not msa_files:
+        print("No MSA files found for IQ-TREE2. Skipping phylogenetic analysis.")
+        sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=PARALLEL_IQTREE_JOBS) as exe:
+        list(exe.map(run_iqtree, msa_files))
+
+    print("✅ IQ-TREE2 Step Completed.")
+
+    # ------------------ Tree File Collection ------------------------------
+    for treefile in glob.glob("iqtreeoutput/**/*.treefile", recursive=True):
+        fast_copy(treefile, os.path.join("treefiles", os.path.basename(treefile)))
+
+    print("All tree files copied to treefiles/.")
+
+    tree_files = glob.glob("treefiles/*.treefile")
+    with ThreadPoolExecutor(max_workers=PARALLEL_JOBS) as exe:
+        list(exe.map(run_foreground_branch, tree_files))
+
+    print("✅ Foreground Branch Selection Completed.")
+
+
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
@@ -5,16 +5,12 @@ Automatically matches MSA files ending with '_msa.best.fas' to their correspondi
 """
 
 import os
-import glob
+import re
 import shutil
-import subprocess
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from collections import deque
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ------------------- Config ------------------- #
 msa_dir = "msa"
 tree_dir = "treefiles"
@@ -27,45 +23,69 @@ if not os.path.isfile(base_ctl_file):
     raise FileNotFoundError(f"Base control file '{base_ctl_file}' not found.")
 os.makedirs(output_dir, exist_ok=True)
 
+# Turn the base ctl into a str.format template once; each species' ctl is a single write
+with open(base_ctl_file) as f:
+    CTL_TEMPLATE = f.read().replace("{", "{{").replace("}", "}}")
+for key, field in (("seqfile", "seqfile"), ("treefile", "treefile"),
+                   ("model", "model"), ("NSsites", "nssites")):
+    CTL_TEMPLATE = re.sub(rf"(?m)^[ \t]*{key}[ \t]*=.*$", f"{key} = {{{field}}}", CTL_TEMPLATE)
+
 # ------------------- Helpers ------------------- #
-def run_command(cmd, cwd=None):
-    print(f"[CMD] {cmd} (cwd={cwd})")
+async def run_command(cmd, cwd=None):
+    """Run a command (argv list, no shell), sending stdout/stderr to run.log in cwd."""
+    print(f"[CMD] {' '.join(cmd)} (cwd={cwd})")
+    log_path = os.path.join(cwd or ".", "run.log")
     try:
-        result = subprocess.run(cmd, shell=True, check=True, cwd=cwd,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.stdout.strip():
-            print(result.stdout)
-        if result.stderr.strip():
-            print("[STDERR]", result.stderr)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Command failed: {cmd}\n{e}")
-        print("[STDOUT]", e.stdout)
-        print("[STDERR]", e.stderr)
+        # codeml is verbose; stream it to disk rather than buffering it in memory
+        with open(log_path, "wb") as log:
+            proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, stdout=log,
+                                                        stderr=asyncio.subprocess.STDOUT)
+            returncode = await proc.wait()
+    except OSError as e:
+        print(f"[ERROR] Could not start {cmd[0]}: {e}")
+        return False
+    if returncode != 0:
+        print(f"[ERROR] Command failed: {' '.join(cmd)} (exit status {returncode})")
+        with open(log_path, encoding="utf-8", errors="replace") as log:
+            tail = deque(log, maxlen=20)
+        print(f"[LOG] Last lines of {log_path}:\n{''.join(tail)}")
         return False
+    return True
 
 
-def prepare_ctl(template_ctl, ctl_path, msa_file_name, tree_file_name):
-    shutil.copy(template_ctl, ctl_path)
-    with open(ctl_path, "r") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        if line.strip().startswith("seqfile"):
-            new_lines.append(f"seqfile = {msa_file_name}\n")
-        elif line.strip().startswith("treefile"):
-            new_lines.append(f"treefile = {tree_file_name}\n")
-        elif line.strip().startswith("model"):
-            new_lines.append("model = 0\n")
-        elif line.strip().startswith("NSsites"):
-            new_lines.append("NSsites = 0 1 2 3 7 8\n")
-        else:
-            new_lines.append(line)
+def use_pidfd_child_watcher():
+    """Have asyncio wait on codeml children through pidfds in the event loop.
+
+    Before Python 3.12 the default ThreadedChildWatcher starts one waiting
+    thread per child; 3.12+ already picks the pidfd watcher where it works.
+    Platforms without pidfd_open keep the default.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
+
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+def prepare_ctl(ctl_path, msa_file_name, tree_file_name):
     with open(ctl_path, "w") as f:
-        f.writelines(new_lines)
+        f.write(CTL_TEMPLATE.format(seqfile=msa_file_name, treefile=tree_file_name,
+                                    model=0, nssites="0 1 2 3 7 8"))
 
 
-def process_species(msa_file_path):
+async def process_species(msa_file_path):
     species = os.path.basename(msa_file_path).replace(".fas", "")
     # Automatically strip "_msa.best" if present to find the correct tree file
     tree_base_name = species.replace("_msa.best", "")
@@ -78,32 +98,53 @@ def process_species(msa_file_path):
     species_output = os.path.join(output_dir, species)
     os.makedirs(species_output, exist_ok=True)
 
-    # Copy files into species folder
-    shutil.copy(msa_file_path, species_output)
-    shutil.copy(tree_file, species_output)
-    shutil.copy(base_ctl_file, species_output)
+    # Link inputs into species folder (codeml only reads them)
+    fast_copy(msa_file_path, os.path.join(species_output, os.path.basename(msa_file_path)))
+    fast_copy(tree_file, os.path.join(species_output, os.path.basename(tree_file)))
 
     ctl_file = os.path.join(species_output, "codeml.ctl")
-    prepare_ctl(base_ctl_file, ctl_file, os.path.basename(msa_file_path), os.path.basename(tree_file))
+    prepare_ctl(ctl_file, os.path.basename(msa_file_path), os.path.basename(tree_file))
 
     print(f"[INFO] Running codeml for {species} (Site Models: 0, 1, 2, 3, 7, 8)")
-    run_command(f"codeml {os.path.basename(ctl_file)}", cwd=species_output)
+    await run_command(["codeml", os.path.basename(ctl_file)], cwd=species_output)
     print(f"[INFO] Completed: {species}")
 
 
+async def run_all(msa_files):
+    """Run every species from one event loop, at most max_parallel codeml at a time.
+
+    With a pidfd child watcher the loop is told when each codeml exits, so no
+    thread sits waiting on one; elsewhere asyncio falls back to a thread per child.
+    """
+    sem = asyncio.Semaphore(max_parallel)
+
+    async def run_one(msa):
+        async with sem:
+            try:
+                await process_species(msa)
+            except Exception as e:
+                print(f"[ERROR] Species {os.path.basename(msa)} failed: {e}")
+
+    await asyncio.gather(*(run_one(msa) for msa in msa_files))
+
+
 # ------------------- Main ------------------- #
-if __name__ == "__main__":
-    msa_files = glob.glob(os.path.join(msa_dir, "*.fas"))
+def main():
+    # One scandir pass; entries carry their type, so no stat per file
+    with os.scandir(msa_dir) as it:
+        msa_files = [e.path for e in it if e.name.endswith(".fas") and e.is_file()]
     if not msa_files:
         print(f"[WARN] No MSA files found in {msa_dir}")
     else:
-        with ThreadPoolExecutor(max_workers=max_parallel) as exe:
-            futures = {exe.submit(process_species, msa): msa for msa in msa_files}
-            for f in as_completed(futures):
-                try:
-                    f.result()
-                except Exception as e:
-                    species_name = os.path.basename(futures[f])
-                    print(f"[ERROR] Species {species_name} failed: {e}")
+        use_pidfd_child_watcher()
+        asyncio.run(run_all(msa_files))
 
     print("✅ All site model analyses completed successfully!")
+
+
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
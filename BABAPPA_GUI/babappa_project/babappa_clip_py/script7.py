@@ -5,15 +5,15 @@ Processes species directories in 'codemlanalysis', runs 'lrt_bh_correction.py',
 """
 
 import os
-import subprocess
+import errno
+import hashlib
+import contextlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import shutil
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ----------------------------
 # Define directories
 # ----------------------------
@@ -21,45 +21,112 @@ base_dir = Path("codemlanalysis")
 output_dir = Path("BHanalysis")
 output_dir.mkdir(parents=True, exist_ok=True)
 
-python_script = Path.cwd() / "lrt_bh_correction.py"
+
+def load_script(path):
+    """Import a pipeline script by path (its file name need not be a valid module name)."""
+    spec = importlib.util.spec_from_file_location(path.stem.replace(".", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def input_key(paths):
+    """Hash the names and contents of the input CSVs; unchanged inputs give the same key."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+# BH script module; imported once per worker process instead of starting python3 (and pandas) per species
+lrt_bh_correction = None
+BH_SCRIPT = Path.cwd() / "lrt_bh_correction.py"
+
+
+def init_worker(script_path):
+    """Pool initializer: load the BH script and its pandas/scipy imports once per process."""
+    global lrt_bh_correction
+    if lrt_bh_correction is None:
+        lrt_bh_correction = load_script(script_path)
+
 
 # ----------------------------
-# Iterate through species directories
+# Process one species directory
 # ----------------------------
-for species_dir in base_dir.iterdir():
-    if not species_dir.is_dir():
-        continue
+def process_species(species_dir):
+    """Run the BH correction for one species and move its Excel results.
+
+    Output is collected and returned so parallel species don't interleave.
+    """
     species_name = species_dir.name
 
     # Find CSV files in the species directory (depth 1)
     csv_files = list(species_dir.glob("*.csv"))
     if not csv_files:
-        print(f"No CSV file found in {species_name}. Skipping...")
-        continue
+        return f"No CSV file found in {species_name}. Skipping..."
 
-    print(f"Processing {species_name}...")
+    # Skip species whose CSVs are unchanged since their results were last produced
+    species_output_dir = output_dir / species_name
+    cache_file = species_output_dir / ".cache_key"
+    key = input_key(csv_files)
+    if (cache_file.is_file() and cache_file.read_text() == key
+            and any(species_output_dir.glob("LRT_results_*.xlsx"))):
+        return f"{species_name}: inputs unchanged, keeping results in {species_output_dir}/"
 
-    # Run the BH correction Python script in the species directory
+    report = [f"Processing {species_name}..."]
+
+    # Run the BH correction on the species directory
+    log = io.StringIO()
     try:
-        subprocess.run(
-            ["python3", str(python_script)],
-            cwd=species_dir,
-            check=True
-        )
-    except subprocess.CalledProcessError:
-        print(f"❌ BH correction failed for {species_name}. Skipping to next species.")
-        continue
+        # stderr too: a shared pool's workers still have the fds of the step that forked them
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            init_worker(BH_SCRIPT)  # no-op unless this worker came from a shared pool without our initializer
+            lrt_bh_correction.run_bh_correction(str(species_dir))
+    except Exception as e:
+        report.append(log.getvalue().rstrip())
+        report.append(f"❌ BH correction failed for {species_name}: {e}. Skipping to next species.")
+        return "\n".join(report)
+    report.append(log.getvalue().rstrip())
 
     # Find generated Excel file(s) matching the pattern
     excel_files = list(species_dir.glob("LRT_results_*.xlsx"))
     if excel_files:
-        species_output_dir = output_dir / species_name
         species_output_dir.mkdir(parents=True, exist_ok=True)
         for excel_file in excel_files:
-            shutil.move(str(excel_file), species_output_dir)
-        print(f"Results moved to {species_output_dir}/")
+            try:
+                os.replace(excel_file, species_output_dir / excel_file.name)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(str(excel_file), species_output_dir)
+        cache_file.write_text(key)
+        report.append(f"Results moved to {species_output_dir}/")
     else:
-        print(f"No Excel file generated for {species_name}.")
+        report.append(f"No Excel file generated for {species_name}.")
+    return "\n".join(report)
+
+
+# ----------------------------
+# Run species directories in parallel
+# ----------------------------
+def main(pool=None):
+    """Correct every species; pool is a shared executor to use instead of starting one."""
+    species_dirs = [d for d in base_dir.iterdir() if d.is_dir()]
+    # Load in the parent first so forked workers inherit the imports; spawned workers load their own
+    init_worker(BH_SCRIPT)
+    executor = (ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker, initargs=(BH_SCRIPT,))
+                if pool is None else contextlib.nullcontext(pool))
+    with executor as ex:
+        for report in ex.map(process_species, species_dirs):
+            print(report)
+
+    print("Batch processing completed.")
 
-print("Batch processing completed.")
 
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
@@ -2,18 +2,17 @@
 """
 script_BH_sitemodel.py - Apply Benjamini-Hochberg correction on codeml site-model CSVs.
 Processes species directories in 'sitemodelanalysis', runs 'lrt_bh_correction.sitemodel.py',
-and moves results to 'BHanalysis4sitemodel/<species>/'.
+and writes results to 'BHanalysis4sitemodel/<species>/'.
 """
 
-import subprocess
+import os
+import hashlib
+import contextlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import shutil
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ----------------------------
 # Define directories
 # ----------------------------
@@ -22,15 +21,45 @@ site_model_dir = base_dir / "sitemodelanalysis"
 bh_analysis_dir = base_dir / "BHanalysis4sitemodel"
 bh_analysis_dir.mkdir(parents=True, exist_ok=True)
 
-python_script = base_dir / "lrt_bh_correction.sitemodel.py"
+
+def load_script(path):
+    """Import a pipeline script by path (its file name need not be a valid module name)."""
+    spec = importlib.util.spec_from_file_location(path.stem.replace(".", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def input_key(paths):
+    """Hash the names and contents of the input CSVs; unchanged inputs give the same key."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+# BH script module; imported once per worker process instead of starting python3 (and pandas) per species
+lrt_bh_sitemodel = None
+BH_SCRIPT = base_dir / "lrt_bh_correction.sitemodel.py"
+
+
+def init_worker(script_path):
+    """Pool initializer: load the BH script and its NumPy/SciPy imports once per process."""
+    global lrt_bh_sitemodel
+    if lrt_bh_sitemodel is None:
+        lrt_bh_sitemodel = load_script(script_path)
+
 
 # ----------------------------
-# Iterate through species directories
+# Process one species directory
 # ----------------------------
-for species_dir in site_model_dir.iterdir():
-    if not species_dir.is_dir():
-        continue
+def process_species(species_dir):
+    """Run the site-model BH correction for one species.
 
+    Results go straight to the species output directory, so parallel species
+    never share an output path.
+    """
     species = species_dir.name
     output_dir = bh_analysis_dir / species
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -38,27 +67,57 @@ for species_dir in site_model_dir.iterdir():
     # Find the first CSV file in the species directory
     csv_files = list(species_dir.glob("*.csv"))
     if not csv_files:
-        print(f"No CSV file found in {species_dir}")
-        continue
+        return f"No CSV file found in {species_dir}"
 
     csv_file = csv_files[0]
-    print(f"Processing {csv_file} for species {species}")
 
-    # Run the BH correction Python script
+    # Skip species whose CSV is unchanged since lrt_results.csv was last produced
+    cache_file = output_dir / ".cache_key"
+    key = input_key([csv_file])
+    if cache_file.is_file() and cache_file.read_text() == key and (output_dir / "lrt_results.csv").is_file():
+        return f"{species}: input unchanged, keeping {output_dir / 'lrt_results.csv'}"
+
+    report = [f"Processing {csv_file} for species {species}"]
+
+    # Run the BH correction
+    log = io.StringIO()
     try:
-        subprocess.run(
-            ["python3", str(python_script), str(csv_file)],
-            check=True
-        )
-    except subprocess.CalledProcessError:
-        print(f"❌ BH correction failed for {species}")
-        continue
-
-    # Move the generated output file to the species output directory
-    output_file = base_dir / "lrt_results.csv"
-    if output_file.is_file():
-        shutil.move(str(output_file), output_dir / output_file.name)
+        # stderr too: a shared pool's workers still have the fds of the step that forked them
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            init_worker(BH_SCRIPT)  # no-op unless this worker came from a shared pool without our initializer
+            result = lrt_bh_sitemodel.run_bh_sitemodel(csv_file, output_dir / "lrt_results.csv")
+    except Exception as e:
+        report.append(log.getvalue().rstrip())
+        report.append(f"❌ BH correction failed for {species}: {e}")
+        return "\n".join(report)
+    report.append(log.getvalue().rstrip())
+    if result is None:
+        report.append(f"Error: No output file generated for {species}")
     else:
-        print(f"Error: No output file generated for {species}")
+        cache_file.write_text(key)
+    return "\n".join(report)
+
+
+# ----------------------------
+# Run species directories in parallel
+# ----------------------------
+def main(pool=None):
+    """Correct every species; pool is a shared executor to use instead of starting one."""
+    species_dirs = [d for d in site_model_dir.iterdir() if d.is_dir()]
+    # Load in the parent first so forked workers inherit the imports; spawned workers load their own
+    init_worker(BH_SCRIPT)
+    executor = (ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker, initargs=(BH_SCRIPT,))
+                if pool is None else contextlib.nullcontext(pool))
+    with executor as ex:
+        for report in ex.map(process_species, species_dirs):
+            print(report)
+
+    print("BH correction for site models completed.")
+
 
-print("BH correction for site models completed.")
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
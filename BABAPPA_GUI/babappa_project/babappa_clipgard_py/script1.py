@@ -19,6 +19,15 @@ def run(cmd, check=True, capture_output=False, **kwargs):
 def ensure_dir(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
 def cpu_count():
     try:
         return multiprocessing.cpu_count()
@@ -58,9 +67,9 @@ def main():
 
     print('IQ-TREE2 Step Completed.')
 
-    # copy treefiles
+    # copy treefiles (hardlinked when possible; they are read-only downstream)
     for p in Path('iqtreeoutput').rglob('*.treefile'):
-        shutil.copy(p, Path('treefiles')/p.name)
+        fast_copy(p, Path('treefiles')/p.name)
     print('All tree files copied to treefiles/.')
 
     # Foreground branch selection
@@ -10,6 +10,7 @@ Faithful Python port of your script2.sh.
 - UTF-8 safe (read/write with encoding='utf-8', errors='replace')
 - Crucially: does NOT abort on non-zero codeml return codes (mimics original shell)
 """
+import os
 import sys
 import io
 import re
@@ -17,7 +18,7 @@ import shutil
 import subprocess
 import multiprocessing
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Make stdout/stderr UTF-8 safe
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
@@ -39,33 +40,75 @@ if not BASE_CTL.exists():
 
 OUTPUT_ROOT.mkdir(parents=True, exist_ok=True)
 
-def run_cmd(cmd, cwd=None):
-    """Run command but don't raise on non-zero return; capture and print stdout/stderr."""
-    print("▶", " ".join(cmd), "in", cwd or ".")
-    res = subprocess.run(cmd, cwd=str(cwd) if cwd else None, capture_output=True, text=True)
-    if res.stdout:
-        print(res.stdout.strip())
-    if res.stderr:
-        print(res.stderr.strip(), file=sys.stderr)
-    if res.returncode != 0:
-        print(f"⚠ Command returned code {res.returncode}: {' '.join(cmd)}", file=sys.stderr)
-    return res.returncode
-
 def update_ctl(template_path: Path, replacements: dict, out_path: Path):
     """Read template_path (utf-8), replace keys with values using regex, write to out_path."""
     txt = template_path.read_text(encoding="utf-8", errors="replace")
-    for key, val in replacements.items():
-        # Replace line like: seqfile = something   -> seqfile = VAL
-        txt = re.sub(rf"(?m)^\s*{re.escape(key)}\s*=.*", f"{key} = {val}", txt)
+    # One pass for all keys: replace lines like  seqfile = something  -> seqfile = VAL
+    # (re caches the compiled pattern, and the key sets repeat across calls)
+    keys = "|".join(re.escape(key) for key in replacements)
+    txt = re.sub(rf"(?m)^\s*({keys})\s*=.*", lambda m: f"{m.group(1)} = {replacements[m.group(1)]}", txt)
     out_path.write_text(txt, encoding="utf-8", errors="replace")
 
-def run_codeml_for_treefile(treefile_path: Path, msa_aligned: Path, species_output: Path):
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+def start_codeml(ctl_name, folder: Path):
+    """Start codeml in folder without waiting; its output goes to folder/run.log."""
+    print("▶", "codeml", ctl_name, "in", folder)
+    with open(folder / "run.log", "wb") as log:
+        return subprocess.Popen(["codeml", ctl_name], cwd=str(folder), stdout=log, stderr=subprocess.STDOUT)
+
+def reap_one(running: dict):
+    """Wait for any running codeml to exit and drop it from running (pid -> (proc, folder))."""
+    if hasattr(os, "wait"):
+        # Keep waiting until one of ours exits, so a reaped stray child never frees a slot
+        pid, status = os.wait()
+        while pid not in running:
+            pid, status = os.wait()
+        proc, folder = running.pop(pid)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        pid = next(iter(running))
+        proc, folder = running.pop(pid)
+        proc.wait()
+    # do not abort on non-zero exit (shell didn't)
+    if proc.returncode != 0:
+        print(f"⚠ codeml returned code {proc.returncode} in {folder} (see run.log)", file=sys.stderr)
+    else:
+        print(f"Finished codeml for {folder.name}")
+
+def run_codeml_jobs(jobs, max_running):
+    """Run codeml for every (ctl_name, folder) with at most max_running at once.
+
+    One process polls all children with os.wait instead of parking a thread on each.
+    """
+    running = {}
+    for ctl_name, folder in jobs:
+        if len(running) >= max_running:
+            reap_one(running)
+        try:
+            proc = start_codeml(ctl_name, folder)
+        except OSError as e:
+            print(f"Error starting codeml in {folder}: {e}", file=sys.stderr)
+            continue
+        running[proc.pid] = (proc, folder)
+    while running:
+        reap_one(running)
+
+def stage_treefile(treefile_path: Path, msa_aligned: Path, species_output: Path):
     """
-    For a single treefile (Path), perform:
+    For a single treefile (Path), stage the folders and ctl files for:
       - Branch model (_B)
       - Branch-site model (_BS)
       - Branch-site null (_BS_NULL)
-    Always attempt all three even if one fails (mimics shell behavior).
+    and return their (ctl_name, folder) codeml jobs. All three are always
+    attempted even if one fails (mimics shell behavior).
     """
     base_name = treefile_path.stem
     tree_name = treefile_path.name
@@ -75,62 +118,59 @@ def run_codeml_for_treefile(treefile_path: Path, msa_aligned: Path, species_outp
     base_ctl_in_species = species_output / "codeml.ctl"
     if not base_ctl_in_species.exists():
         print(f"Error: ctl not found under {species_output}; skipping {tree_name}")
-        return
+        return []
 
     # ensure the treefile is present in species_output (some callers may have copied already)
     local_tree = species_output / tree_name
     if not local_tree.exists():
         try:
-            shutil.copy(treefile_path, local_tree)
+            fast_copy(treefile_path, local_tree)
         except Exception as e:
             print(f"Error copying treefile {treefile_path} -> {local_tree}: {e}", file=sys.stderr)
             # still attempt with original path below
 
-    # Helper to write ctl and run codeml (non-fatal)
-    def do_model(suffix, ctl_updates):
+    # Helper to write ctl and inputs for one model (non-fatal)
+    def stage_model(suffix, ctl_updates):
         folder = species_output / f"{base_name}{suffix}"
         folder.mkdir(parents=True, exist_ok=True)
-        # Copy base species ctl into folder and then update it
+        # Render the base species ctl into the folder (no intermediate copy)
         target_ctl = folder / f"{base_name}{suffix.lstrip('_')}.ctl"  # e.g. AT5... .B.ctl or .BS.ctl
-        shutil.copy(base_ctl_in_species, target_ctl)
         # Make replacements so control file refers to local files (names)
         # If treefile exists in folder, use its name; else use original treefile name
         tree_to_write = (folder / tree_name).name if (species_output / tree_name).exists() else tree_name
         replacements = {"seqfile": msa_name, "treefile": tree_to_write}
         replacements.update(ctl_updates)
-        # Update the control file in the folder
-        update_ctl(target_ctl, replacements, target_ctl)
-        # copy aligned.fas and treefile into the folder (if available)
+        # Write the updated control file into the folder
+        update_ctl(base_ctl_in_species, replacements, target_ctl)
+        # link aligned.fas and treefile into the folder (if available); codeml only reads them
         try:
-            shutil.copy(msa_aligned, folder / msa_name)
+            fast_copy(msa_aligned, folder / msa_name)
         except Exception as e:
             print(f"Warning: failed to copy MSA to {folder}: {e}", file=sys.stderr)
         # copy treefile (use species_output copy if present, else original)
         if (species_output / tree_name).exists():
             try:
-                shutil.copy(species_output / tree_name, folder / tree_name)
+                fast_copy(species_output / tree_name, folder / tree_name)
             except Exception as e:
                 print(f"Warning: failed to copy treefile into {folder}: {e}", file=sys.stderr)
         else:
             try:
-                shutil.copy(treefile_path, folder / tree_name)
+                fast_copy(treefile_path, folder / tree_name)
             except Exception as e:
                 print(f"Warning: failed to copy original treefile into {folder}: {e}", file=sys.stderr)
-
-        print(f"Running codeml for {folder.name}")
-        # Run codeml; do not raise on non-zero exit (shell didn't)
-        rc = run_cmd(["codeml", target_ctl.name], cwd=folder)
-        return rc
-
-    # Branch model (model=2, NSsites=0)
-    do_model(
-        suffix=f"_{base_name}_B".replace(f"_{base_name}_","_B_") if False else "_B",  # keep exact folder names like <base>_B
-        ctl_updates={"model": "2", "NSsites": "0"}
-    )
-    # Branch-site model (model=2, NSsites=2)
-    do_model("_BS", {"model": "2", "NSsites": "2"})
-    # Branch-site NULL (model=2, NSsites=2, fix_omega=1, omega=1)
-    do_model("_BS_NULL", {"model": "2", "NSsites": "2", "fix_omega": "1", "omega": "1"})
+        return target_ctl.name, folder
+
+    jobs = []
+    for suffix, ctl_updates in (
+        ("_B", {"model": "2", "NSsites": "0"}),                                      # Branch model
+        ("_BS", {"model": "2", "NSsites": "2"}),                                     # Branch-site model
+        ("_BS_NULL", {"model": "2", "NSsites": "2", "fix_omega": "1", "omega": "1"}),  # Branch-site NULL
+    ):
+        try:
+            jobs.append(stage_model(suffix, ctl_updates))
+        except Exception as e:
+            print(f"Error staging {base_name}{suffix}: {e}", file=sys.stderr)
+    return jobs
 
 def process_species(msa_file: Path):
     """
@@ -141,16 +181,16 @@ def process_species(msa_file: Path):
         print(f"\n--- Processing block: {species}")
 
         # Prepare species output dir
-        species_output = OUTPUT_ROOT / species
+        # Absolute, since these paths are handed to codeml Popen calls that run with cwd=folder
+        species_output = (OUTPUT_ROOT / species).resolve()
         species_output.mkdir(parents=True, exist_ok=True)
 
-        # Copy aligned MSA (as aligned.fas) and base ctl into species dir
+        # Link aligned MSA (as aligned.fas) into species dir; model folders link this one copy
         aligned_target = species_output / "aligned.fas"
-        shutil.copy(msa_file, aligned_target)
-        shutil.copy(BASE_CTL, species_output / "codeml.ctl")
+        fast_copy(msa_file, aligned_target)
 
-        # Patch seqfile in species/codeml.ctl to aligned.fas (so per-model copies inherit it)
-        update_ctl(species_output / "codeml.ctl", {"seqfile": "aligned.fas"}, species_output / "codeml.ctl")
+        # Write species/codeml.ctl from the base ctl with seqfile = aligned.fas (so per-model ctls inherit it)
+        update_ctl(BASE_CTL, {"seqfile": "aligned.fas"}, species_output / "codeml.ctl")
 
         # Find treefiles under foregroundbranch/<species>/
         species_tree_dir = TREE_ROOT / species
@@ -166,23 +206,24 @@ def process_species(msa_file: Path):
         # copy all treefiles into species_output (mirrors cp "$species_tree_dir"/*.treefile "$species_output")
         for tf in treefiles:
             try:
-                shutil.copy(tf, species_output / tf.name)
+                fast_copy(tf, species_output / tf.name)
             except Exception as e:
                 print(f"Warning: failed to copy {tf} into {species_output}: {e}", file=sys.stderr)
 
         # Inner parallelism: use available cores
         inner_workers = max(1, multiprocessing.cpu_count())
-        print(f"Launching up to {inner_workers} parallel tree jobs for {species} (found {len(treefiles)} treefiles).")
-
-        # Submit treefile jobs (we pass the original tf path to ensure copy works if needed)
-        with ThreadPoolExecutor(max_workers=inner_workers) as ex:
-            futures = [ex.submit(run_codeml_for_treefile, tf, aligned_target, species_output) for tf in treefiles]
-            for fut in as_completed(futures):
-                try:
-                    _ = fut.result()
-                except Exception as e:
-                    # ensure we do not abort the whole species if one tree thread throws
-                    print(f"Error in codeml run (thread): {e}", file=sys.stderr)
+        print(f"Launching up to {inner_workers} parallel codeml runs for {species} (found {len(treefiles)} treefiles).")
+
+        # Stage every model folder first (we pass the original tf path to ensure copy works if needed),
+        # then run all the codeml jobs from this process
+        jobs = []
+        for tf in treefiles:
+            try:
+                jobs.extend(stage_treefile(tf, aligned_target, species_output))
+            except Exception as e:
+                # ensure we do not abort the whole species if one treefile fails
+                print(f"Error staging codeml runs for {tf}: {e}", file=sys.stderr)
+        run_codeml_jobs(jobs, inner_workers)
 
         print(f"Completed block: {species}")
     except Exception as e:
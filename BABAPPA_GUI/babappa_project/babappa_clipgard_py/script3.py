@@ -26,63 +26,74 @@ base_ctl_file = Path("codeml.ctl")
 if not msa_parent_dir.is_dir() or not tree_dir.is_dir() or not base_ctl_file.is_file():
     raise SystemExit("Error: Required directories or files are missing.")
 
+# Read the template once; each block's ctl is written straight from memory
+with open(base_ctl_file) as f:
+    BASE_CTL_LINES = f.readlines()
+
+# Index treefiles once instead of globbing tree_dir for every block
+with os.scandir(tree_dir) as it:
+    TREE_INDEX = {e.name[:-len(".treefile")]: Path(e.path)
+                  for e in it if e.name.endswith(".treefile") and e.is_file()}
+
+# ---------------------------------------------------------------------------
+# codeml.ctl lines rewritten for the M0 run, keyed by the parameter name
+CTL_REPLACEMENTS = {
+    "seqfile": "seqfile = aligned.fas\n",
+    "treefile": "treefile = treefile.treefile\n",
+    "model": "model = 0\n",
+    "NSsites": "NSsites = 0\n",
+}
+
+# ---------------------------------------------------------------------------
+# Function: fast_copy
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
 # ---------------------------------------------------------------------------
 # Function: process_species
 def process_species(msa_path: Path):
     species = msa_path.stem  # full block name (e.g. ATCOL_QC_msa.best.fas.gard_block1_1-305)
     species_output = output_dir / species
 
-    tree_file_candidates = list(tree_dir.glob(f"{species}.treefile"))
+    tree_file = TREE_INDEX.get(species)
     if not msa_path.is_file():
         print(f"Warning: MSA file for {species} not found. Skipping...")
         return
-    if not tree_file_candidates:
+    if tree_file is None:
         print(f"Warning: Tree file for {species} not found. Skipping...")
         return
 
-    tree_file = tree_file_candidates[0]
-
-    # Prepare output directory
-    species_output.mkdir(parents=True, exist_ok=True)
-
-    # Copy required input files
-    shutil.copy(msa_path, species_output / "aligned.fas")
-    shutil.copy(tree_file, species_output / "treefile.treefile")
-    shutil.copy(base_ctl_file, species_output / "codeml.ctl")
-
-    # Modify codeml.ctl in place
-    ctl_path = species_output / "codeml.ctl"
-    with open(ctl_path, "r") as f:
-        lines = f.readlines()
-
-    with open(ctl_path, "w") as f:
-        for line in lines:
-            if line.strip().startswith("seqfile"):
-                f.write("seqfile = aligned.fas\n")
-            elif line.strip().startswith("treefile"):
-                f.write("treefile = treefile.treefile\n")
-            elif line.strip().startswith("model"):
-                f.write("model = 0\n")
-            elif line.strip().startswith("NSsites"):
-                f.write("NSsites = 0\n")
-            else:
-                f.write(line)
-
-    # Run codeml inside M0 folder
+    # codeml runs inside the M0 folder and only reads its inputs, so link them there directly
     m0_folder = species_output / "M0"
-    m0_folder.mkdir(exist_ok=True)
+    m0_folder.mkdir(parents=True, exist_ok=True)
+
+    fast_copy(msa_path, m0_folder / "aligned.fas")
+    fast_copy(tree_file, m0_folder / "treefile.treefile")
 
-    shutil.copy(ctl_path, m0_folder / "M0.ctl")
-    shutil.copy(species_output / "aligned.fas", m0_folder / "aligned.fas")
-    shutil.copy(species_output / "treefile.treefile", m0_folder / "treefile.treefile")
+    # Write the customised control file
+    new_lines = [CTL_REPLACEMENTS.get(line.split("=", 1)[0].strip(), line) for line in BASE_CTL_LINES]
+    with open(m0_folder / "M0.ctl", "w") as f:
+        f.writelines(new_lines)
 
     print(f"Processing M0 model for {species}")
     subprocess.run(["codeml", "M0.ctl"], cwd=m0_folder, check=True)
     print(f"Completed M0 model for {species}")
 
 # ---------------------------------------------------------------------------
-# Detect blocks
-species_files = list(msa_parent_dir.glob("*/*.fas"))  # look inside subfolders
+# Detect blocks: recombination_blocks/*/*.fas, listed with scandir to reuse cached file types
+species_files = []
+with os.scandir(msa_parent_dir) as blocks:
+    for block_dir in blocks:
+        if not block_dir.is_dir():
+            continue
+        with os.scandir(block_dir.path) as it:
+            species_files.extend(Path(e.path) for e in it if e.name.endswith(".fas") and e.is_file())
 num_parallel = len(species_files)
 print(f"Detected {num_parallel} blocks. Running all in parallel.")
 
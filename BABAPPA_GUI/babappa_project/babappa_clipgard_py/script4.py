@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import os
 import sys
 import io
 import shutil
@@ -18,6 +19,15 @@ def run(cmd, check=True, capture_output=False, **kwargs):
 def ensure_dir(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
 def main():
     msa_parent_dir = Path("recombination_blocks")
     tree_dir = Path("treefiles")
@@ -29,6 +39,12 @@ def main():
         sys.exit(1)
     ensure_dir(output_dir)
 
+    # Turn the base ctl into a str.format template once; each block's ctl is a single write
+    ctl_template = base_ctl_file.read_text().replace("{", "{{").replace("}", "}}")
+    for key, field in (("seqfile", "seqfile"), ("treefile", "treefile"),
+                       ("model", "model"), ("NSsites", "nssites")):
+        ctl_template = re.sub(rf"(?m)^[ \t]*{key}[ \t]*=.*$", f"{key} = {{{field}}}", ctl_template)
+
     threads = []
     # Look inside recombination_blocks/*/*.fas
     for msa_file in sorted(msa_parent_dir.glob("*/*.fas")):
@@ -43,21 +59,16 @@ def main():
         species_output = output_dir / species
         ensure_dir(species_output)
 
-        # Copy required files
-        shutil.copy(msa_file, species_output / msa_file.name)
-        shutil.copy(tree_file, species_output / tree_file.name)
-        shutil.copy(base_ctl_file, species_output / "codeml.ctl")
+        # Link required files (codeml only reads them)
+        fast_copy(msa_file, species_output / msa_file.name)
+        fast_copy(tree_file, species_output / tree_file.name)
 
         ctl_file = species_output / "codeml.ctl"
-        txt = ctl_file.read_text()
-        txt = re.sub(r'^\s*seqfile\s*=.*', f'seqfile = {msa_file.name}', txt, flags=re.M)
-        txt = re.sub(r'^\s*treefile\s*=.*', f'treefile = {tree_file.name}', txt, flags=re.M)
-        txt = re.sub(r'^\s*model\s*=.*', 'model = 0', txt, flags=re.M)
-        txt = re.sub(r'^\s*NSsites\s*=.*', 'NSsites = 0 1 2 3 7 8', txt, flags=re.M)
-        ctl_file.write_text(txt)
+        ctl_file.write_text(ctl_template.format(seqfile=msa_file.name, treefile=tree_file.name,
+                                                model=0, nssites="0 1 2 3 7 8"))
 
         def run_job(sp_out, ctl_name):
-            run(['bash','-c', f'cd {sp_out} && codeml {ctl_name}'])
+            run(['codeml', ctl_name], cwd=sp_out)
             print('Completed:', sp_out.name)
 
         # Run in parallel with thread limit (8 concurrent jobs max)
@@ -3,9 +3,12 @@
 import os
 import sys
 import io
+import mmap
+import re
 import shutil
 import subprocess
 import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Force stdout/stderr to UTF-8
@@ -25,35 +28,50 @@ def cpu_count():
     except Exception:
         return 1
 
+def find_lnl_line(path):
+    # mmap + bytes find: nothing is decoded until the first lnL(ntime hit
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            idx = mm.find(b'lnL(ntime')
+            if idx == -1:
+                return ''
+            end = mm.find(b'\n', idx)
+            start = mm.rfind(b'\n', 0, idx) + 1
+            return mm[start:end if end != -1 else len(mm)].decode('ascii', 'replace').strip()
+
+def scan_species(species_path):
+    # Runs in a worker process; returns the CSV rows and lets the parent write them
+    rows = []
+    for analysis_path in sorted(species_path.glob('*/')):
+        analysis_name = analysis_path.name
+        if (analysis_path/'output.txt').exists():
+            lnL_np_line = find_lnl_line(analysis_path/'output.txt')
+            if lnL_np_line:
+                parts = lnL_np_line.split()
+                lnL = parts[4] if len(parts) >=5 else ''
+                np_v = ''
+                m = re.search(r'np:\s*([0-9]+)', lnL_np_line)
+                if m: np_v = m.group(1)
+                rows.append(f'{analysis_name},{lnL},{np_v}\n')
+    return species_path.name, rows
+
 def main():
     input_dir = Path('codemloutput')
     output_dir = Path('codemlanalysis')
     ensure_dir(output_dir)
-    import re
-    for species_path in sorted(input_dir.glob('*/')):
-        species_name = species_path.name
-        for analysis_path in sorted(species_path.glob('*/')):
-            analysis_name = analysis_path.name
-            if (analysis_path/'output.txt').exists():
-                lnL_np_line = ''
-                with open(analysis_path/'output.txt') as fh:
-                    for line in fh:
-                        if 'lnL(ntime' in line:
-                            lnL_np_line = line.strip()
-                            break
-                if lnL_np_line:
-                    parts = lnL_np_line.split()
-                    lnL = parts[4] if len(parts) >=5 else ''
-                    np_v = ''
-                    m = re.search(r'np:\s*([0-9]+)', lnL_np_line)
-                    if m: np_v = m.group(1)
-                    species_output_dir = Path(output_dir)/species_name
-                    ensure_dir(species_output_dir)
-                    output_file = species_output_dir/'lnL_np_values.csv'
-                    if not output_file.exists():
-                        output_file.write_text('Analysis,lnL,np\n')
-                    with open(output_file,'a') as outfh:
-                        outfh.write(f'{analysis_name},{lnL},{np_v}\n')
+    species_paths = sorted(input_dir.glob('*/'))
+    with ProcessPoolExecutor(max_workers=cpu_count()) as ex:
+        # One write per species instead of an open/append per analysis
+        for species_name, rows in ex.map(scan_species, species_paths):
+            if not rows:
+                continue
+            species_output_dir = Path(output_dir)/species_name
+            ensure_dir(species_output_dir)
+            with open(species_output_dir/'lnL_np_values.csv', 'w') as outfh:
+                outfh.write('Analysis,lnL,np\n')
+                outfh.writelines(rows)
     print('Extraction complete. Results saved in', output_dir)
 
 if __name__ == '__main__':
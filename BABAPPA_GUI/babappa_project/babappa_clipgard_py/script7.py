@@ -1,50 +1,100 @@
 #!/usr/bin/env python3
 """Auto-converted from the user's shell script; aim to keep logic unchanged."""
 import os
+import errno
 import sys
 import io
+import hashlib
+import contextlib
+import importlib.util
 import shutil
-import subprocess
 import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Force stdout/stderr to UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
 
-def run(cmd, check=True, capture_output=False, **kwargs):
-    print('▶', ' '.join(cmd) if isinstance(cmd, (list,tuple)) else cmd)
-    return subprocess.run(cmd, check=check, capture_output=capture_output, text=True, **kwargs)
-
 def ensure_dir(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
+def move(src, dst):
+    """Rename in place; copy only when src and dst are on different filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(src), str(dst))
+
 def cpu_count():
     try:
         return multiprocessing.cpu_count()
     except Exception:
         return 1
 
+def load_script(path):
+    """Import a pipeline script by path (its file name need not be a valid module name)."""
+    spec = importlib.util.spec_from_file_location(path.stem.replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def input_key(paths):
+    """Hash the names and contents of the input CSVs; unchanged inputs give the same key."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+# BH script module; imported once per worker process instead of starting python3 (and pandas) per species
+lrt_bh_correction = None
+BH_SCRIPT = Path.cwd()/'lrt_bh_correction.py'
+
+def init_worker(script_path):
+    """Pool initializer: load the BH script and its pandas/scipy imports once per process."""
+    global lrt_bh_correction
+    if lrt_bh_correction is None:
+        lrt_bh_correction = load_script(script_path)
+
+def process_species(species_dir, output_dir):
+    # Output is collected per species so parallel runs don't interleave
+    species_name = species_dir.name
+    csv_file = next(species_dir.glob('*.csv'), None)
+    if not csv_file:
+        return f'No CSV file found in {species_name} Skipping...'
+    # Skip species whose CSVs are unchanged since their results were last produced
+    cache_file = output_dir/species_name/'.cache_key'
+    key = input_key(species_dir.glob('*.csv'))
+    if (cache_file.is_file() and cache_file.read_text() == key
+            and any((output_dir/species_name).glob('LRT_results_*.xlsx'))):
+        return f'{species_name}: inputs unchanged, keeping results in {output_dir/species_name}'
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        lrt_bh_correction.run_bh_correction(str(species_dir))
+    report = [f'Processing {species_name}', log.getvalue().rstrip()]
+    excel_file = next(species_dir.glob('LRT_results_*.xlsx'), None)
+    if excel_file:
+        ensure_dir(output_dir/species_name)
+        move(excel_file, output_dir/species_name/excel_file.name)
+        cache_file.write_text(key)
+        report.append(f'Results moved to {output_dir/species_name}')
+    else:
+        report.append(f'No Excel file generated for {species_name}')
+    return '\n'.join(report)
+
 def main():
     base_dir = Path('codemlanalysis')
     output_dir = Path('BHanalysis')
     ensure_dir(output_dir)
-    python_script = Path.cwd()/'lrt_bh_correction.py'
-    for species_dir in sorted(base_dir.glob('*/')):
-        species_name = species_dir.name
-        csv_file = next(species_dir.glob('*.csv'), None)
-        if not csv_file:
-            print('No CSV file found in', species_name, 'Skipping...')
-            continue
-        print('Processing', species_name)
-        run(['bash','-lc', f'cd {species_dir} && python3 {python_script}'])
-        excel_file = next(species_dir.glob('LRT_results_*.xlsx'), None)
-        if excel_file:
-            ensure_dir(output_dir/species_name)
-            shutil.move(str(excel_file), str(output_dir/species_name/excel_file.name))
-            print('Results moved to', output_dir/species_name)
-        else:
-            print('No Excel file generated for', species_name)
+    species_dirs = sorted(base_dir.glob('*/'))
+    # Load in the parent first so forked workers inherit the imports; spawned workers load their own
+    init_worker(BH_SCRIPT)
+    with ProcessPoolExecutor(max_workers=cpu_count(), initializer=init_worker, initargs=(BH_SCRIPT,)) as ex:
+        for report in ex.map(process_species, species_dirs, [output_dir] * len(species_dirs)):
+            print(report)
     print('Batch processing completed.')
 
 if __name__ == '__main__':
@@ -3,9 +3,12 @@
 import os
 import sys
 import io
-import shutil
+import hashlib
+import contextlib
+import importlib.util
 import subprocess
 import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Force stdout/stderr to UTF-8
@@ -25,25 +28,65 @@ def cpu_count():
     except Exception:
         return 1
 
+def load_script(path):
+    """Import a pipeline script by path (its file name need not be a valid module name)."""
+    spec = importlib.util.spec_from_file_location(path.stem.replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def input_key(paths):
+    """Hash the names and contents of the input CSVs; unchanged inputs give the same key."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+# BH script module; imported once per worker process instead of starting python3 (and pandas) per species
+lrt_bh_sitemodel = None
+BH_SCRIPT = Path.cwd()/'lrt_bh_correction.sitemodel.py'
+
+def init_worker(script_path):
+    """Pool initializer: load the BH script and its NumPy/SciPy imports once per process."""
+    global lrt_bh_sitemodel
+    if lrt_bh_sitemodel is None:
+        lrt_bh_sitemodel = load_script(script_path)
+
+def process_species(species_dir, bh_analysis_dir):
+    # Results go straight to the species output dir, so parallel species never share a path
+    species = species_dir.name
+    output_dir = bh_analysis_dir/species
+    ensure_dir(output_dir)
+    csv_file = next(species_dir.glob('*.csv'), None)
+    if not csv_file:
+        return f'No CSV file found in {species_dir}'
+    # Skip species whose CSV is unchanged since lrt_results.csv was last produced
+    cache_file = output_dir/'.cache_key'
+    key = input_key([csv_file])
+    if cache_file.is_file() and cache_file.read_text() == key and (output_dir/'lrt_results.csv').is_file():
+        return f"{species}: input unchanged, keeping {output_dir/'lrt_results.csv'}"
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = lrt_bh_sitemodel.run_bh_sitemodel(csv_file, output_dir/'lrt_results.csv')
+    report = [f'Processing {csv_file} for species {species}', log.getvalue().rstrip()]
+    if result is None:
+        report.append(f'Error: No output file generated for {species}')
+    else:
+        cache_file.write_text(key)
+    return '\n'.join(report)
+
 def main():
     BASE_DIR = Path.cwd()
     SITE_MODEL_DIR = BASE_DIR/'sitemodelanalysis'
     BH_ANALYSIS_DIR = BASE_DIR/'BHanalysis4sitemodel'
     ensure_dir(BH_ANALYSIS_DIR)
-    for species_dir in sorted(SITE_MODEL_DIR.glob('*/')):
-        species = species_dir.name
-        output_dir = BH_ANALYSIS_DIR/species
-        ensure_dir(output_dir)
-        csv_file = next(species_dir.glob('*.csv'), None)
-        if csv_file:
-            print('Processing', csv_file, 'for species', species)
-            run(['python3', str(BASE_DIR/'lrt_bh_correction.sitemodel.py'), str(csv_file)])
-            if (BASE_DIR/'lrt_results.csv').exists():
-                shutil.move(str(BASE_DIR/'lrt_results.csv'), str(output_dir/'lrt_results.csv'))
-            else:
-                print('Error: No output file generated for', species)
-        else:
-            print('No CSV file found in', species_dir)
+    species_dirs = sorted(SITE_MODEL_DIR.glob('*/'))
+    # Load in the parent first so forked workers inherit the imports; spawned workers load their own
+    init_worker(BH_SCRIPT)
+    with ProcessPoolExecutor(max_workers=cpu_count(), initializer=init_worker, initargs=(BH_SCRIPT,)) as ex:
+        for report in ex.map(process_species, species_dirs, [BH_ANALYSIS_DIR] * len(species_dirs)):
+            print(report)
 
 if __name__ == '__main__':
     main()
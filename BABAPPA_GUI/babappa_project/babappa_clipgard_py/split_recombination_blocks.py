@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import sys, os, json
-from Bio import SeqIO
 import sys, io
 
 # Force stdout/stderr to UTF-8 (portable)
@@ -49,15 +48,31 @@ def adjust_to_codon_boundaries(start_nt, end_nt, aln_len_nt):
     trim_end   = orig_end - end_nt
     return start_nt, end_nt, trim_start, trim_end
 
+def read_fasta(fasta_file):
+    """Return [(header, sequence)] as bytes; header is the '>' line without '>'."""
+    records = []
+    header, buf = None, []
+    with open(fasta_file, "rb") as fh:
+        for line in fh:
+            if line.startswith(b">"):
+                if header is not None:
+                    records.append((header, b"".join(buf)))
+                header, buf = line[1:].rstrip(), []
+            elif header is not None:
+                buf.append(line.strip().replace(b" ", b""))
+    if header is not None:
+        records.append((header, b"".join(buf)))
+    return records
+
 def split_by_gard_json(fasta_file, json_file, output_dir="recombination_blocks"):
     # Load alignment
-    records = list(SeqIO.parse(fasta_file, "fasta"))
+    records = read_fasta(fasta_file)
     if not records:
         raise ValueError(f"No sequences found in {fasta_file}")
-    aln_len_nt = len(records[0].seq)
+    aln_len_nt = len(records[0][1])
 
-    for r in records:
-        if len(r.seq) != aln_len_nt:
+    for _, seq in records:
+        if len(seq) != aln_len_nt:
             raise ValueError(f"Inconsistent sequence lengths in {fasta_file}")
 
     # Load JSON
@@ -112,12 +127,10 @@ def split_by_gard_json(fasta_file, json_file, output_dir="recombination_blocks")
                 org_dir,
                 f"{fasta_base}.gard_block{idx}_{cs}-{ce}.fas"
             )
-            block_records = []
-            for rec in records:
-                rec_copy = rec[:]
-                rec_copy.seq = rec.seq[snt-1:ent]
-                block_records.append(rec_copy)
-            SeqIO.write(block_records, out_file, "fasta")
+            # Same column range for every record: byte slices written as-is, no decoding or record copies
+            with open(out_file, "wb", buffering=1 << 16) as out:
+                for header, seq in records:
+                    out.write(b">" + header + b"\n" + seq[snt-1:ent] + b"\n")
 
             msg = (f"✔ Saved block {idx}: {out_file}\n"
                    f"   Trimmed {trim_start} nt at start, {trim_end} nt at end\n")
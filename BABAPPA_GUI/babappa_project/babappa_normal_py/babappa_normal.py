@@ -4,8 +4,15 @@ Babappa Normal Sequential Runner
 Runs script0.py → script1.py → ... → script8.py sequentially.
 """
 
+import os
+import atexit
+import contextlib
+import importlib.util
+import inspect
 import subprocess
 import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys, io
 
@@ -33,20 +40,83 @@ scripts = [
 logs_dir = BASE_DIR / "logs"
 logs_dir.mkdir(exist_ok=True)
 
+# One worker pool for every step whose main() takes a pool, started on first use
+# and shut down at exit, instead of each step starting and tearing down its own.
+# Workers keep the fds 1/2 they were forked with (the log of whichever step first
+# used the pool), so those steps capture both stdout and stderr in the workers
+# and return that output for the parent to print into the current step's log.
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+@contextlib.contextmanager
+def redirect_output(log):
+    """Send this process's stdout/stderr to log at the fd level.
+
+    Tools the steps start (codeml, iqtree2, ...) write to fds 1/2 directly,
+    so swapping sys.stdout alone would not catch their output.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+def call_main(module_name: str):
+    """Import a step and run its main() in this process; return True on success."""
+    try:
+        main = importlib.import_module(module_name).main
+        if "pool" in inspect.signature(main).parameters:
+            main(pool=get_pool())
+        else:
+            main()
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+        return e.code in (None, 0)
+    except Exception:
+        traceback.print_exc()
+        return False
+    return True
+
+
 def run_script(script_name: str):
     script_path = BASE_DIR / script_name
-    log_file = logs_dir / f"{script_name.replace('.py', '')}.log"
+    module_name = script_name.replace('.py', '')
+    log_file = logs_dir / f"{module_name}.log"
 
     print(f"▶ Running {script_name}...")
 
     with log_file.open("w") as f:
-        process = subprocess.run(
-            [sys.executable, str(script_path)],
-            stdout=f,
-            stderr=subprocess.STDOUT
-        )
+        if importlib.util.find_spec(module_name) is not None:
+            # Run in-process: no interpreter start-up and re-import per step
+            with redirect_output(f):
+                success = call_main(module_name)
+        else:
+            success = subprocess.run(
+                [sys.executable, str(script_path)],
+                stdout=f,
+                stderr=subprocess.STDOUT
+            ).returncode == 0
 
-    if process.returncode != 0:
+    if not success:
         print(f"❌ {script_name} failed. Check log: {log_file}")
         return False
     else:
@@ -17,26 +17,37 @@ output_fasta = sys.argv[2]
 tolerance = 0.05  # maximum fraction of internal stops/ambiguous codons
 
 STOP_CODONS = {"TAA", "TAG", "TGA"}
+STOP_CODON_BYTES = frozenset(c.encode("ascii") for c in STOP_CODONS)
 
-def mask_internal_codons(codon_seq):
-    codons = [codon_seq[i:i+3] for i in range(0, len(codon_seq), 3)]
-    masked_codons = []
+def mask_internal_codons(codon_seq, tolerance=None):
+    """Return (masked_seq, mask_fraction).
+
+    If tolerance is given, stop as soon as the masked fraction exceeds it and
+    return (None, fraction): the sequence will be discarded anyway.
+    """
+    n_codons = -(-len(codon_seq) // 3)  # counts a trailing incomplete codon
+    denom = max(n_codons, 1)
+    n_full = len(codon_seq) // 3
+    # skip incomplete codon (will trim later); mask in place instead of building a codon list
+    out = bytearray(codon_seq[:n_full * 3], "ascii")
+    upper = bytes(out).upper()
+    # last codon: allow natural stop codon (only when it is the final, complete codon)
+    last = (n_full - 1) * 3 if n_full == n_codons else -1
     mask_count = 0
 
-    for i, codon in enumerate(codons):
-        if len(codon) < 3:
-            # skip incomplete codon (will trim later)
+    for i in range(0, n_full * 3, 3):
+        codon = upper[i:i + 3]
+        if codon in STOP_CODON_BYTES:
+            if i == last:
+                continue
+        elif 78 not in codon:  # b"N"
             continue
-        # last codon: allow natural stop codon
-        if i == len(codons) - 1 and codon.upper() in STOP_CODONS:
-            masked_codons.append(codon)
-        elif codon.upper() in STOP_CODONS or "N" in codon.upper():
-            masked_codons.append("---")
-            mask_count += 1
-        else:
-            masked_codons.append(codon)
+        out[i:i + 3] = b"---"
+        mask_count += 1
+        if tolerance is not None and mask_count / denom > tolerance:
+            return None, mask_count / denom
 
-    return "".join(masked_codons), mask_count / max(len(codons), 1)
+    return out.decode("ascii"), mask_count / denom
 
 def clean_and_validate(seq_str):
     """Ensure sequence length is divisible by 3 and no leftover stop codons remain."""
@@ -57,13 +68,12 @@ def process_msa(input_fasta, output_fasta, tolerance):
     discarded_records = []
 
     for record in SeqIO.parse(input_fasta, "fasta"):
-        masked_seq, mask_fraction = mask_internal_codons(str(record.seq))
-        cleaned_seq = clean_and_validate(masked_seq)
+        masked_seq, mask_fraction = mask_internal_codons(str(record.seq), tolerance)
 
-        if mask_fraction > tolerance:
+        if masked_seq is None or mask_fraction > tolerance:
             discarded_records.append(record.id)
         else:
-            record.seq = Seq(cleaned_seq)
+            record.seq = Seq(clean_and_validate(masked_seq))
             kept_records.append(record)
 
     SeqIO.write(kept_records, output_fasta, "fasta")
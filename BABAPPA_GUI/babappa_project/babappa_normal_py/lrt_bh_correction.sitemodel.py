@@ -1,41 +1,11 @@
 # LRT analysis with BH correction for site models
-import pandas as pd
-import scipy.stats as stats
-from statsmodels.stats.multitest import multipletests
+import csv
+from scipy.special import chdtrc
+import numpy as np
 import os
 import sys
 import re
 
-# Get CSV file path from arguments
-if len(sys.argv) < 2:
-    raise FileNotFoundError("No CSV file provided.")
-
-csv_file = sys.argv[1]
-
-print(f"Checking file: {csv_file}")
-
-if not os.path.exists(csv_file):
-    raise FileNotFoundError(f"File not found: {csv_file}")
-
-# Load the CSV
-df = pd.read_csv(csv_file)
-
-print("CSV content preview:")
-print(df.head())
-
-expected_columns = {"Model", "lnL", "np"}
-if not expected_columns.issubset(df.columns):
-    raise ValueError("CSV file does not contain the expected columns.")
-
-# --- Normalize model names ---
-# Keep only "Model <number>"
-df["Model"] = df["Model"].astype(str).apply(
-    lambda x: re.search(r"Model\s*\d+", x).group(0) if re.search(r"Model\s*\d+", x) else x
-)
-
-print("Normalized Model column:")
-print(df["Model"].unique())
-
 # Define model comparisons (cleaned names only)
 comparisons = [
     ("Model 0", "Model 1"),
@@ -44,36 +14,112 @@ comparisons = [
     ("Model 7", "Model 8")
 ]
 
-lrt_results = []
-
-# Perform LRT for each comparison
-for null_model, alt_model in comparisons:
-    if null_model in df["Model"].values and alt_model in df["Model"].values:
-        lnL0 = df.loc[df["Model"] == null_model, "lnL"].values[0]
-        lnL1 = df.loc[df["Model"] == alt_model, "lnL"].values[0]
-        np0 = df.loc[df["Model"] == null_model, "np"].values[0]
-        np1 = df.loc[df["Model"] == alt_model, "np"].values[0]
-
-        LRT_stat = 2 * (lnL1 - lnL0)
-        df_diff = np1 - np0
-        p_value = stats.chi2.sf(LRT_stat, df_diff)
-
-        lrt_results.append((null_model, alt_model, LRT_stat, df_diff, p_value))
-
-# Check if we got any results
-if not lrt_results:
-    print("No valid model comparisons found in file. Skipping BH correction.")
-    sys.exit(0)
-
-# Convert results to DataFrame
-lrt_df = pd.DataFrame(lrt_results, columns=["Null Model", "Alternative Model", "LRT Statistic", "df", "p-value"])
-
-# Apply BH correction
-lrt_df["BH-corrected p-value"] = multipletests(lrt_df["p-value"], method="fdr_bh")[1]
-
-# Save results
-output_file = "lrt_results.csv"
-lrt_df.to_csv(output_file, index=False)
 
-print(f"Analysis complete. Results saved to {output_file}")
-print(lrt_df)
+def bh_adjust(p_values):
+    """Benjamini-Hochberg adjusted p-values (same as multipletests(..., method="fdr_bh")[1])."""
+    p = np.asarray(p_values, dtype=float)
+    m = len(p)
+    order = np.argsort(p)
+    # q_(k) = min over j >= k of m * p_(j) / j, capped at 1
+    q = p[order] * m / np.arange(1, m + 1)
+    q = np.minimum.accumulate(q[::-1])[::-1]
+    adjusted = np.empty_like(q)
+    adjusted[order] = np.minimum(q, 1)
+    return adjusted
+
+
+def to_number(value):
+    """Parse a CSV cell as int when it is one (as pandas would), else as float (empty -> NaN)."""
+    value = (value or "").strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value) if value else float("nan")
+
+
+def run_bh_sitemodel(csv_file, output_file="lrt_results.csv"):
+    """Run the site-model LRTs on csv_file, BH-correct them and save to output_file.
+
+    Returns the output path, or None when no model comparison could be made.
+    """
+    print(f"Checking file: {csv_file}")
+
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(f"File not found: {csv_file}")
+
+    # Load the CSV (a handful of rows; csv is enough, no DataFrame needed)
+    with open(csv_file, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+        rows = list(reader)
+
+    print("CSV content preview:")
+    print(",".join(columns))
+    for row in rows[:5]:
+        print(",".join(row[c] or "" for c in columns))
+
+    expected_columns = {"Model", "lnL", "np"}
+    if not expected_columns.issubset(columns):
+        raise ValueError("CSV file does not contain the expected columns.")
+
+    # --- Normalize model names ---
+    # Keep only "Model <number>"
+    for row in rows:
+        match = re.search(r"Model\s*\d+", row["Model"] or "")
+        if match:
+            row["Model"] = match.group(0)
+
+    print("Normalized Model column:")
+    print(list(dict.fromkeys(row["Model"] for row in rows)))
+
+    # Index by model once (first row per model, as before) instead of rescanning per comparison
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(row["Model"], row)
+    valid = [(n, a) for n, a in comparisons if n in by_model and a in by_model]
+
+    # Check if we got any results
+    if not valid:
+        print("No valid model comparisons found in file. Skipping BH correction.")
+        return None
+
+    # Perform all LRTs at once
+    null_models = [n for n, _ in valid]
+    alt_models = [a for _, a in valid]
+
+    def column(models, name):
+        return np.array([to_number(by_model[m][name]) for m in models])
+
+    LRT_stat = 2 * (column(alt_models, "lnL") - column(null_models, "lnL"))
+    df_diff = column(alt_models, "np") - column(null_models, "np")
+    # chdtrc is the ufunc behind chi2.sf, without the distribution-object dispatch. Unlike
+    # chi2.sf it gives NaN (not 1.0) for a negative statistic, e.g. when codeml reports M8
+    # slightly below M7, and one NaN would spread to every BH value, so clip at 0 first
+    p_value = chdtrc(df_diff, np.maximum(LRT_stat, 0))
+
+    # Apply BH correction
+    bh_p_value = bh_adjust(p_value)
+
+    header = ["Null Model", "Alternative Model", "LRT Statistic", "df", "p-value", "BH-corrected p-value"]
+    results = list(zip(null_models, alt_models, LRT_stat.tolist(), df_diff.tolist(),
+                       p_value.tolist(), bh_p_value.tolist()))
+
+    # Save results
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(results)
+
+    print(f"Analysis complete. Results saved to {output_file}")
+    print("\t".join(header))
+    for result in results:
+        print("\t".join(map(str, result)))
+    return output_file
+
+
+if __name__ == "__main__":
+    # Get CSV file path from arguments
+    if len(sys.argv) < 2:
+        raise FileNotFoundError("No CSV file provided.")
+
+    run_bh_sitemodel(sys.argv[1])
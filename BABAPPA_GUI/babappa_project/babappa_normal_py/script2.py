@@ -7,16 +7,13 @@ This version provides real-time logging and shows stdout/stderr for each codeml
 
 import os
 import glob
+import asyncio
 import shutil
-import subprocess
+import tempfile
 import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ------------------- Config ------------------- #
 num_parallel = None  # None = auto-detect cores
 inner_parallel = None  # None = auto-detect cores
@@ -25,6 +22,7 @@ msa_dir = "msa"
 tree_dir = "foregroundbranch"
 output_dir = "codemloutput"
 base_ctl_file = "codeml.ctl"
+scratch_dir = "/dev/shm"  # tmpfs on Linux: codeml's scratch writes (rub, rst, ...) stay in RAM
 
 # Verify critical directories/files exist
 for path in [msa_dir, tree_dir, base_ctl_file]:
@@ -42,50 +40,84 @@ print(f"[INFO] Detected {total_cores} CPU cores. Using {num_parallel} species in
 
 
 # ------------------- Helpers ------------------- #
-def run_command(cmd, cwd=None):
-    """Run a shell command safely and print stdout/stderr."""
-    print(f"[CMD] {cmd} (cwd={cwd})")
+async def run_command(cmd, cwd=None):
+    """Run a command (argv list, no shell) and print stdout/stderr."""
+    print(f"[CMD] {' '.join(cmd)} (cwd={cwd})")
     try:
-        result = subprocess.run(cmd, shell=True, check=True, cwd=cwd,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                text=True)
-        print(result.stdout)
-        if result.stderr.strip():
-            print("[STDERR]", result.stderr)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Command failed: {cmd}\n{e}")
-        print("[STDOUT]", e.stdout)
-        print("[STDERR]", e.stderr)
+        proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await proc.communicate()
+    except OSError as e:
+        print(f"[ERROR] Could not start {cmd[0]}: {e}")
+        return False
+    stdout = stdout.decode("utf-8", errors="replace")
+    stderr = stderr.decode("utf-8", errors="replace")
+    if proc.returncode != 0:
+        print(f"[ERROR] Command failed: {' '.join(cmd)} (exit status {proc.returncode})")
+        print("[STDOUT]", stdout)
+        print("[STDERR]", stderr)
         return False
+    print(stdout)
+    if stderr.strip():
+        print("[STDERR]", stderr)
+    return True
+
+
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
 
 
 def prepare_ctl(template_ctl, ctl_path, treefile, model, ns_sites, fix_omega=None, omega=None):
     """Prepare a codeml control file."""
-    shutil.copy(template_ctl, ctl_path)
-    with open(ctl_path, "r") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        if line.strip().startswith("seqfile"):
-            new_lines.append("seqfile = aligned.fas\n")
-        elif line.strip().startswith("treefile"):
-            new_lines.append(f"treefile = {treefile}\n")
-        elif line.strip().startswith("model"):
-            new_lines.append(f"model = {model}\n")
-        elif line.strip().startswith("NSsites"):
-            new_lines.append(f"NSsites = {ns_sites}\n")
-        elif fix_omega is not None and line.strip().startswith("fix_omega"):
-            new_lines.append(f"fix_omega = {fix_omega}\n")
-        elif omega is not None and line.strip().startswith("omega"):
-            new_lines.append(f"omega = {omega}\n")
-        else:
-            new_lines.append(line)
-    with open(ctl_path, "w") as f:
-        f.writelines(new_lines)
-
-
-def run_codeml_for_treefile(treefile, species_output, base_name):
+    replacements = {
+        "seqfile": "seqfile = aligned.fas\n",
+        "treefile": f"treefile = {treefile}\n",
+        "model": f"model = {model}\n",
+        "NSsites": f"NSsites = {ns_sites}\n",
+    }
+    if fix_omega is not None:
+        replacements["fix_omega"] = f"fix_omega = {fix_omega}\n"
+    if omega is not None:
+        replacements["omega"] = f"omega = {omega}\n"
+    # Stream the template straight into the new ctl, one line at a time
+    with open(template_ctl) as src, open(ctl_path, "w") as out:
+        for line in src:
+            out.write(replacements.get(line.split("=", 1)[0].strip(), line))
+
+
+async def run_codeml_in_scratch(ctl_name, folder, inputs):
+    """Run codeml on a tmpfs copy of folder's inputs and move what it writes back to folder.
+
+    Runs in folder itself when there is no tmpfs to use.
+    """
+    if not os.path.isdir(scratch_dir):
+        return await run_command(["codeml", ctl_name], cwd=folder)
+    try:
+        work = tempfile.mkdtemp(prefix="babappa_codeml_", dir=scratch_dir)
+    except OSError:
+        return await run_command(["codeml", ctl_name], cwd=folder)
+    try:
+        for name in inputs:
+            fast_copy(os.path.join(folder, name), os.path.join(work, name))
+        ok = await run_command(["codeml", ctl_name], cwd=work)
+        # Keep everything codeml produced (output.txt, rst, ...), not just output.txt
+        with os.scandir(work) as it:
+            for entry in it:
+                if entry.name not in inputs:
+                    shutil.move(entry.path, os.path.join(folder, entry.name))
+        return ok
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+async def run_codeml_for_treefile(treefile, species_output, base_name):
     """Run codeml for a single treefile with branch, branch-site, and null models."""
     msa_file = "aligned.fas"
     print(f"[INFO] Starting treefile {treefile} in {species_output}")
@@ -101,26 +133,69 @@ def run_codeml_for_treefile(treefile, species_output, base_name):
         os.makedirs(folder, exist_ok=True)
         ctl_path = os.path.join(folder, f"{base_name}.{suffix}.ctl")
         prepare_ctl(base_ctl_file, ctl_path, treefile, model, ns_sites, fix_omega, omega)
-        shutil.copy(os.path.join(species_output, msa_file), folder)
-        shutil.copy(os.path.join(species_output, treefile), folder)
+        # MSA and tree are read-only for codeml, so link them; the ctl above is a real copy
+        fast_copy(os.path.join(species_output, msa_file), os.path.join(folder, msa_file))
+        fast_copy(os.path.join(species_output, treefile), os.path.join(folder, treefile))
         print(f"[INFO] Running codeml for {treefile} model {suffix}")
-        run_command(f"codeml {os.path.basename(ctl_path)}", cwd=folder)
+        await run_codeml_in_scratch(os.path.basename(ctl_path), folder,
+                                    (os.path.basename(ctl_path), msa_file, treefile))
 
     print(f"[INFO] Finished treefile {treefile} in {species_output}")
 
 
-def process_species(species):
+def index_msas(msa_dir):
+    """Map species name -> MSA path with one scandir pass over msa_dir."""
+    suffix = "_msa.best.fas"
+    msa_index = {}
+    with os.scandir(msa_dir) as it:
+        for entry in it:
+            if entry.name.endswith(suffix) and entry.is_file():
+                msa_index.setdefault(entry.name[:-len(suffix)], entry.path)
+    return msa_index
+
+
+def use_pidfd_child_watcher():
+    """Have asyncio wait on codeml children through pidfds in the event loop.
+
+    Before Python 3.12 the default ThreadedChildWatcher starts one waiting
+    thread per child; 3.12+ already picks the pidfd watcher where it works.
+    Platforms without pidfd_open keep the default.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
+
+async def run_treefiles(treefiles, species_output):
+    """Run every treefile's models from one event loop, at most inner_parallel treefiles at a time.
+
+    With a pidfd child watcher the loop is told when each codeml exits, so no
+    thread sits waiting on one; elsewhere asyncio falls back to a thread per child.
+    """
+    sem = asyncio.Semaphore(inner_parallel)
+
+    async def run_one(tf):
+        async with sem:
+            try:
+                await run_codeml_for_treefile(tf, species_output, tf.replace(".treefile", ""))
+            except Exception as e:
+                print(f"[ERROR] Treefile {tf} failed: {e}")
+
+    await asyncio.gather(*(run_one(tf) for tf in treefiles))
+
+
+def process_species(species, msa_file):
     """Process all treefiles for one species."""
-    species_output = os.path.join(output_dir, species)
+    # Absolute, so every path handed to the treefile workers and codeml is independent of the cwd
+    species_output = os.path.abspath(os.path.join(output_dir, species))
     species_tree_dir = os.path.join(tree_dir, species)
     os.makedirs(species_output, exist_ok=True)
 
-    msa_file_list = glob.glob(os.path.join(msa_dir, f"{species}_msa.best.fas"))
-    if not msa_file_list:
-        print(f"[WARN] MSA file for {species} not found. Skipping...")
-        return
-    msa_file = msa_file_list[0]
-    shutil.copy(msa_file, os.path.join(species_output, "aligned.fas"))
+    fast_copy(msa_file, os.path.join(species_output, "aligned.fas"))
     shutil.copy(base_ctl_file, species_output)
 
     if not os.path.isdir(species_tree_dir):
@@ -130,29 +205,26 @@ def process_species(species):
     # Copy all treefiles into species output folder
     treefiles = glob.glob(os.path.join(species_tree_dir, "*.treefile"))
     for treefile in treefiles:
-        shutil.copy(treefile, species_output)
+        fast_copy(treefile, os.path.join(species_output, os.path.basename(treefile)))
 
     # Now run codeml for each treefile in parallel (inner)
     treefiles_local = [os.path.basename(t) for t in treefiles]
-    futures = []
-    with ThreadPoolExecutor(max_workers=inner_parallel) as exe:
-        for tf in treefiles_local:
-            base_name = tf.replace(".treefile", "")
-            futures.append(exe.submit(run_codeml_for_treefile, tf, species_output, base_name))
-        for _ in as_completed(futures):
-            pass
+    use_pidfd_child_watcher()
+    asyncio.run(run_treefiles(treefiles_local, species_output))
 
     print(f"[INFO] Completed processing for {species}")
 
 
 # ------------------- Main ------------------- #
-if __name__ == "__main__":
-    species_list = [os.path.basename(f).replace("_msa.best.fas", "")
-                    for f in glob.glob(os.path.join(msa_dir, "*_msa.best.fas"))]
+def main():
+    msa_index = index_msas(msa_dir)
+    species_list = list(msa_index)
     print(f"[INFO] Found {len(species_list)} species: {species_list}")
 
-    with ThreadPoolExecutor(max_workers=num_parallel) as exe:
-        futures = {exe.submit(process_species, sp): sp for sp in species_list}
+    # Species run in separate processes so their Python-side staging doesn't share one GIL;
+    # each species then drives its treefiles' codeml runs from one event loop
+    with ProcessPoolExecutor(max_workers=num_parallel) as exe:
+        futures = {exe.submit(process_species, sp, msa_index[sp]): sp for sp in species_list}
         for f in as_completed(futures):
             sp = futures[f]
             try:
@@ -161,3 +233,11 @@ if __name__ == "__main__":
                 print(f"[ERROR] Species {sp} failed: {e}")
 
     print("[INFO] All species processing completed.")
+
+
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
@@ -12,10 +12,6 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ------------------- Config ------------------- #
 num_parallel = None  # None = auto-detect cores
 msa_dir = "msa"
@@ -30,6 +26,10 @@ for path in [msa_dir, tree_dir, base_ctl_file]:
 
 os.makedirs(output_dir, exist_ok=True)
 
+# Index treefiles once instead of globbing tree_dir for every species
+tree_index = {f[:-len(".treefile")]: os.path.join(tree_dir, f)
+              for f in os.listdir(tree_dir) if f.endswith(".treefile")}
+
 # Auto-detect cores
 total_cores = multiprocessing.cpu_count()
 num_parallel = num_parallel or max(1, total_cores // 2)
@@ -38,10 +38,10 @@ print(f"[INFO] Detected {total_cores} CPU cores. Using {num_parallel} species in
 
 # ------------------- Helpers ------------------- #
 def run_command(cmd, cwd=None):
-    """Run a shell command and capture output."""
-    print(f"[CMD] {cmd} (cwd={cwd})")
+    """Run a command (argv list, no shell) and capture output."""
+    print(f"[CMD] {' '.join(cmd)} (cwd={cwd})")
     try:
-        result = subprocess.run(cmd, shell=True, check=True, cwd=cwd,
+        result = subprocess.run(cmd, check=True, cwd=cwd,
                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         if result.stdout.strip():
             print(result.stdout)
@@ -49,31 +49,37 @@ def run_command(cmd, cwd=None):
             print("[STDERR]", result.stderr)
         return True
     except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Command failed: {cmd}\n{e}")
+        print(f"[ERROR] Command failed: {' '.join(cmd)}\n{e}")
         print("[STDOUT]", e.stdout)
         print("[STDERR]", e.stderr)
         return False
+    except OSError as e:
+        print(f"[ERROR] Could not start {cmd[0]}: {e}")
+        return False
+
+
+def fast_copy(src, dst):
+    """Hardlink src to dst when both are on one filesystem; otherwise copy it."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
 
 
 def prepare_ctl(template_ctl, ctl_path, seqfile, treefile, model=0, ns_sites=0):
     """Prepare a codeml control file for M0 model."""
-    shutil.copy(template_ctl, ctl_path)
-    with open(ctl_path, "r") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        if line.strip().startswith("seqfile"):
-            new_lines.append(f"seqfile = {seqfile}\n")
-        elif line.strip().startswith("treefile"):
-            new_lines.append(f"treefile = {treefile}\n")
-        elif line.strip().startswith("model"):
-            new_lines.append(f"model = {model}\n")
-        elif line.strip().startswith("NSsites"):
-            new_lines.append(f"NSsites = {ns_sites}\n")
-        else:
-            new_lines.append(line)
-    with open(ctl_path, "w") as f:
-        f.writelines(new_lines)
+    replacements = {
+        "seqfile": f"seqfile = {seqfile}\n",
+        "treefile": f"treefile = {treefile}\n",
+        "model": f"model = {model}\n",
+        "NSsites": f"NSsites = {ns_sites}\n",
+    }
+    # Stream the template straight into the new ctl, one line at a time
+    with open(template_ctl) as src, open(ctl_path, "w") as out:
+        for line in src:
+            out.write(replacements.get(line.split("=", 1)[0].strip(), line))
 
 
 def process_species(species):
@@ -83,22 +89,16 @@ def process_species(species):
 
     # Find MSA and tree files
     msa_file_list = glob.glob(os.path.join(msa_dir, f"{species}_msa.best.fas"))
-    tree_file_list = glob.glob(os.path.join(tree_dir, f"{species}.treefile"))
+    tree_file = tree_index.get(species)
 
     if not msa_file_list:
         print(f"[WARN] MSA file for {species} not found. Skipping...")
         return
-    if not tree_file_list:
+    if tree_file is None:
         print(f"[WARN] Tree file for {species} not found. Skipping...")
         return
 
     msa_file = msa_file_list[0]
-    tree_file = tree_file_list[0]
-
-    # Copy files to species output folder
-    shutil.copy(msa_file, os.path.join(species_output, "aligned.fas"))
-    shutil.copy(tree_file, os.path.join(species_output, "treefile.treefile"))
-    shutil.copy(base_ctl_file, species_output)
 
     # Prepare control file in M0 folder
     m0_folder = os.path.join(species_output, "M0")
@@ -106,18 +106,18 @@ def process_species(species):
     ctl_path = os.path.join(m0_folder, "M0.ctl")
     prepare_ctl(base_ctl_file, ctl_path, "aligned.fas", "treefile.treefile")
 
-    # Copy inputs into M0 folder
-    shutil.copy(os.path.join(species_output, "aligned.fas"), m0_folder)
-    shutil.copy(os.path.join(species_output, "treefile.treefile"), m0_folder)
+    # codeml runs inside the M0 folder and only reads its inputs, so link them straight there
+    fast_copy(msa_file, os.path.join(m0_folder, "aligned.fas"))
+    fast_copy(tree_file, os.path.join(m0_folder, "treefile.treefile"))
 
     # Run codeml
     print(f"[INFO] Running M0 model for {species}")
-    run_command(f"codeml {os.path.basename(ctl_path)}", cwd=m0_folder)
+    run_command(["codeml", os.path.basename(ctl_path)], cwd=m0_folder)
     print(f"[INFO] Completed M0 model for {species}")
 
 
 # ------------------- Main ------------------- #
-if __name__ == "__main__":
+def main():
     # List species from MSA files
     species_list = [os.path.basename(f).replace("_msa.best.fas", "")
                     for f in glob.glob(os.path.join(msa_dir, "*_msa.best.fas"))]
@@ -134,3 +134,11 @@ if __name__ == "__main__":
                 print(f"[ERROR] Species {sp} failed: {e}")
 
     print("[INFO] All M0 model processing completed.")
+
+
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
@@ -5,15 +5,14 @@ script5.py - Extract lnL and np values from PAML codeml outputs
 """
 
 import os
+import contextlib
 import csv
+import mmap
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys, io
 
-# Force stdout/stderr to UTF-8 (portable)
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
-
 # ----------------------------
 # Set up input and output directories
 # ----------------------------
@@ -21,14 +20,30 @@ input_dir = Path("codemloutput")
 output_dir = Path("codemlanalysis")
 output_dir.mkdir(parents=True, exist_ok=True)
 
+
+def find_lnl_line(path):
+    """Return the first lnL(ntime ...) line of a codeml output, or None.
+
+    The file is memory-mapped and searched as bytes, so no line is decoded until the hit.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            idx = mm.find(b"lnL(ntime")
+            if idx == -1:
+                return None
+            end = mm.find(b"\n", idx)
+            start = mm.rfind(b"\n", 0, idx) + 1
+            return mm[start:end if end != -1 else len(mm)].decode("ascii", "replace").strip()
+
+
 # ----------------------------
-# Iterate through all species directories
+# Scan one species directory
 # ----------------------------
-for species_path in input_dir.iterdir():
-    if not species_path.is_dir():
-        continue
-    species_name = species_path.name
-
+def scan_species(species_path):
+    """Return (species name, [analysis, lnL, np] rows) for one species directory."""
+    rows = []
     for analysis_path in species_path.iterdir():
         if not analysis_path.is_dir():
             continue
@@ -38,45 +53,54 @@ for species_path in input_dir.iterdir():
         # ----------------------------
         # Check if output.txt exists
         # ----------------------------
-        if output_file_path.is_file():
-            # Read the file and look for lnL(ntime ...) line
-            with open(output_file_path) as f:
-                lines = f.readlines()
-
-            lnL_np_line = None
-            for line in lines:
-                if "lnL(ntime" in line:
-                    lnL_np_line = line.strip()
-                    break
-
-            if lnL_np_line:
-                # ----------------------------
-                # Extract lnL and np values
-                # ----------------------------
-                # lnL is typically the 5th column (0-indexed 4)
-                parts = lnL_np_line.split()
-                lnL = parts[4] if len(parts) >= 5 else ""
-
-                # np is after 'np:' and before ')'
-                np_match = re.search(r"np:\s*(\d+)", lnL_np_line)
-                np_value = np_match.group(1) if np_match else ""
-
-                # ----------------------------
-                # Organize CSV output
-                # ----------------------------
-                species_output_dir = output_dir / species_name
-                species_output_dir.mkdir(parents=True, exist_ok=True)
-                csv_file = species_output_dir / "lnL_np_values.csv"
-
-                # Initialize CSV with headers if not exists
-                if not csv_file.exists():
-                    with open(csv_file, "w", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow(["Analysis", "lnL", "np"])
-
-                # Append values
-                with open(csv_file, "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([analysis_name, lnL, np_value])
-
-print(f"Extraction complete. Results saved in {output_dir}.")
+        if not output_file_path.is_file():
+            continue
+
+        lnL_np_line = find_lnl_line(output_file_path)
+
+        if lnL_np_line:
+            # ----------------------------
+            # Extract lnL and np values
+            # ----------------------------
+            # lnL is typically the 5th column (0-indexed 4)
+            parts = lnL_np_line.split()
+            lnL = parts[4] if len(parts) >= 5 else ""
+
+            # np is after 'np:' and before ')'
+            np_match = re.search(r"np:\s*(\d+)", lnL_np_line)
+            np_value = np_match.group(1) if np_match else ""
+
+            rows.append([analysis_name, lnL, np_value])
+    return species_path.name, rows
+
+
+def write_csv(species_name, rows):
+    """Write one species' rows to codemlanalysis/<species>/lnL_np_values.csv in a single open."""
+    species_output_dir = output_dir / species_name
+    species_output_dir.mkdir(parents=True, exist_ok=True)
+    with open(species_output_dir / "lnL_np_values.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Analysis", "lnL", "np"])
+        writer.writerows(rows)
+
+
+# ----------------------------
+# Scan species directories in parallel; the parent writes the CSVs
+# ----------------------------
+def main(pool=None):
+    """Extract every species; pool is a shared executor to use instead of starting one."""
+    species_paths = [p for p in input_dir.iterdir() if p.is_dir()]
+    with ProcessPoolExecutor() if pool is None else contextlib.nullcontext(pool) as ex:
+        for species_name, rows in ex.map(scan_species, species_paths):
+            if rows:
+                write_csv(species_name, rows)
+
+    print(f"Extraction complete. Results saved in {output_dir}.")
+
+
+if __name__ == "__main__":
+    # Force stdout/stderr to UTF-8 (portable) when run directly; a runner
+    # that imports this module keeps its own streams
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
+    main()
@@ -1,43 +1,45 @@
 #!/usr/bin/env python3
+import os
 import re
 import csv
 from pathlib import Path
 
+MODEL_RE = re.compile(r"^\s*NSsites Model (\d+):")
+LNL_RE = re.compile(r"lnL\(.*np:\s*(\d+)\):\s*([-0-9.]+)")
+
 def parse_output_file(output_file: Path, csv_file: Path):
-    models = []
-    lnL_values = []
-    np_values = []
+    rows = []
 
+    current_model = None
+    # Stream the file line by line; the regexes tolerate the trailing newline
     with open(output_file, "r", encoding="utf-8", errors="replace") as f:
-        lines = f.readlines()
+        for line in f:
+            # Detect NSsites Model lines
+            match_model = MODEL_RE.match(line)
+            if match_model:
+                current_model = f"Model {match_model.group(1)}"
+                continue
 
-    current_model = None
-    for line in lines:
-        # Detect NSsites Model lines
-        match_model = re.match(r"^\s*NSsites Model (\d+):", line)
-        if match_model:
-            current_model = f"Model {match_model.group(1)}"
-            continue
+            # Detect lnL line after a model
+            if current_model:
+                match_lnL = LNL_RE.search(line)
+                if match_lnL:
+                    np_val = match_lnL.group(1)
+                    lnL_val = match_lnL.group(2)
 
-        # Detect lnL line after a model
-        if current_model:
-            match_lnL = re.search(r"lnL\(.*np:\s*(\d+)\):\s*([-0-9.]+)", line)
-            if match_lnL:
-                np_val = match_lnL.group(1)
-                lnL_val = match_lnL.group(2)
+                    rows.append([current_model, np_val, lnL_val])
 
-                models.append(current_model)
-                np_values.append(np_val)
-                lnL_values.append(lnL_val)
+                    current_model = None  # reset until next Model line
 
-                current_model = None  # reset until next Model line
+    if not rows:
+        print(f"Warning: no lnL values found in {output_file}, skipping.")
+        return
 
-    # Write CSV
-    with open(csv_file, "w", newline="", encoding="utf-8") as csv_out:
+    # Write CSV in one batch
+    with open(csv_file, "w", newline="", encoding="utf-8", buffering=1 << 20) as csv_out:
         writer = csv.writer(csv_out)
         writer.writerow(["Model", "np", "lnL"])
-        for m, npv, lnLv in zip(models, np_values, lnL_values):
-            writer.writerow([m, npv, lnLv])
+        writer.writerows(rows)
 
     print(f"Extraction complete. Results saved to {csv_file}")
 
@@ -47,14 +49,17 @@ def main():
     base_dir.mkdir(exist_ok=True)
 
     # Assume each site model run has an output.txt inside sitemodel/*/
-    for sm_dir in Path("sitemodel").iterdir():
-        if sm_dir.is_dir():
-            output_file = sm_dir / "output.txt"
+    # (scandir entries carry the file type, so is_dir() needs no extra stat)
+    with os.scandir("sitemodel") as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            output_file = Path(entry.path) / "output.txt"
             if not output_file.exists():
                 print(f"Warning: {output_file} not found, skipping.")
                 continue
 
-            out_csv_dir = base_dir / sm_dir.name
+            out_csv_dir = base_dir / entry.name
             out_csv_dir.mkdir(parents=True, exist_ok=True)
             csv_file = out_csv_dir / "lnL_np_values.csv"
 
@@ -1,21 +1,72 @@
 import argparse
 import numpy as np
-from Bio import SeqIO
+import mmap
 import os
 import sys, io
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+
+# Compiled QC kernels are cached under the user's cache dir rather than a __pycache__
+# next to this script: the API moves every subfolder of the model folder into the results
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "babappa", "numba"))
+try:
+    from numba import njit, prange
+except ImportError:  # optional; QC falls back to the per-record Python checks
+    njit = None
 
 # Force stdout/stderr to UTF-8 (portable)
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8", errors="replace")
 
 # Constants for biological QC
-START_CODON = "ATG"
-STOP_CODONS = {"TAA", "TAG", "TGA"}
-VALID_NUCLEOTIDES = {"A", "T", "G", "C"}
+# (sequences are handled as ASCII bytes, as read from the file)
+START_CODON = b"ATG"
+STOP_CODONS = {b"TAA", b"TAG", b"TGA"}
+VALID_NUCLEOTIDES = b"ATGC"
+# 1 for each valid nucleotide byte, 0 for every other byte value
+ATGC_LUT = np.zeros(256, dtype=np.uint8)
+ATGC_LUT[list(VALID_NUCLEOTIDES)] = 1
+# Stop codons packed as 24-bit big-endian ASCII ints, e.g. b"TAA" -> 0x544141
+STOP_CODON_INTS = tuple(int.from_bytes(c, "big") for c in sorted(STOP_CODONS))
+# Deleted from sequence lines when records are read, in the same pass that uppercases them
+SEQ_WHITESPACE = b" \t\r\n\v\f"
+_UPPER = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+def read_fasta(fasta_file):
+    """
+    Yields (id, uppercase sequence) as bytes for each record of a FASTA file.
+    The file is memory-mapped and split on b"\\n>"; the ID is the first word
+    of the header, as Bio.SeqIO gives it in record.id.
+    """
+    with open(fasta_file, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Anything before the first header is ignored
+            if mm[:1] == b">":
+                pos = 0
+            else:
+                pos = mm.find(b"\n>") + 1
+                if pos == 0:
+                    return
+            while True:
+                end = mm.find(b"\n>", pos)
+                end_of_record = end if end >= 0 else len(mm)
+                # Both ends found with mm.find (memchr-backed) rather than by splitting lines
+                header_end = mm.find(b"\n", pos, end_of_record)
+                if header_end < 0:
+                    header_end = end_of_record
+                words = mm[pos + 1:header_end].split(None, 1)
+                # One C pass deletes the line breaks (and any stray blanks) from the body and uppercases it
+                yield (words[0] if words else b""), mm[header_end:end_of_record].translate(_UPPER, SEQ_WHITESPACE)
+                if end < 0:
+                    break
+                pos = end + 1
 
-def is_valid_sequence(seq: str) -> tuple[bool, str | None]:
+def is_valid_sequence(seq: bytes) -> tuple[bool, str | None]:
     """
     Returns (True, None) if the sequence is valid, else (False, reason).
+    seq is expected in uppercase (read_fasta uppercases it once).
     Quality criteria:
       - Starts with ATG
       - Ends with a valid stop codon (TAA, TAG, or TGA)
@@ -23,7 +74,6 @@ def is_valid_sequence(seq: str) -> tuple[bool, str | None]:
       - Contains only A, T, G, C
       - No internal in-frame stop codons
     """
-    seq = seq.upper()
     if not seq.startswith(START_CODON):
         return False, "Does not start with ATG"
     if seq[-3:] not in STOP_CODONS:
@@ -32,43 +82,161 @@ def is_valid_sequence(seq: str) -> tuple[bool, str | None]:
         return False, "Length less than 300 bp"
     if len(seq) % 3 != 0:
         return False, "Length not divisible by 3"
-    if not set(seq).issubset(VALID_NUCLEOTIDES):
+    if seq.translate(None, VALID_NUCLEOTIDES):
         return False, "Contains non-ATGC characters"
-    for i in range(3, len(seq) - 3, 3):
-        if seq[i:i+3] in STOP_CODONS:
-            return False, f"Internal stop codon at position {i+1}"
+    i = first_internal_stop(seq)
+    if i >= 0:
+        return False, f"Internal stop codon at position {i+1}"
     return True, None
 
-def filter_sequences_by_quality(sequences, log_file_path):
+def first_internal_stop(seq: bytes) -> int:
     """
-    Applies biological QC checks and logs failures.
-    
-    Returns a dictionary of sequences that passed QC.
+    Returns the index of the first in-frame stop codon between the start and
+    final codons, or -1 if there is none.
+    Each stop codon is searched for with bytes.find (C substring search);
+    out-of-frame hits are skipped, and a clean sequence costs three misses.
     """
-    passed = {}
-    with open(log_file_path, "w") as log_file:
-        for id_, seq in sequences.items():
-            valid, reason = is_valid_sequence(seq)
-            if valid:
-                passed[id_] = seq.upper()  # ensure output is uppercase
+    first = -1
+    limit = len(seq) - 3
+    for stop in STOP_CODONS:
+        p = seq.find(stop, 3, limit)
+        while p >= 0 and p % 3:
+            p = seq.find(stop, p + 1, limit)
+        if p >= 0:
+            # Later codons only need to be searched up to this hit
+            first = limit = p
+    return first
+
+# Failure reasons by the code the batched kernel returns (0 = passed)
+QC_REASONS = (
+    None,
+    "Does not start with ATG",
+    "Does not end with a valid stop codon",
+    "Length less than 300 bp",
+    "Length not divisible by 3",
+    "Contains non-ATGC characters",
+    "Internal stop codon at position {}",
+)
+# Loading the cached kernel (or compiling it, on the very first run) still costs more
+# than QC of a small file, so small inputs stay on the Python checks
+JIT_MIN_BASES = 100_000
+# Records are QC'd and released in batches of about this many bases
+QC_BATCH_BASES = 1 << 24
+# Records are written out this many at a time, as one joined write
+WRITE_BATCH_RECORDS = 4096
+
+if njit is not None:
+    @njit(nogil=True, cache=True)
+    def _is_stop(b0, b1, b2):
+        # Packed like STOP_CODON_INTS and compared with | rather than short-circuiting, so no branches
+        packed = (np.uint32(b0) << 16) | (np.uint32(b1) << 8) | np.uint32(b2)
+        return (packed == STOP_CODON_INTS[0]) | (packed == STOP_CODON_INTS[1]) | (packed == STOP_CODON_INTS[2])
+
+    @njit(nogil=True, parallel=True, cache=True)
+    def qc_kernel(buf, offs, out_reason, out_pos):
+        """Same checks, in the same order, as is_valid_sequence for every record of buf.
+
+        Record i is buf[offs[i]:offs[i+1]]; its reason code goes to out_reason[i]
+        and, for an internal stop, the 1-based position to out_pos[i].
+        """
+        for i in prange(offs.shape[0] - 1):
+            s = offs[i]
+            e = offs[i + 1]
+            n = e - s
+            reason = 0
+            pos = 0
+            if n < 3 or buf[s] != 65 or buf[s + 1] != 84 or buf[s + 2] != 71:
+                reason = 1
+            elif not _is_stop(buf[e - 3], buf[e - 2], buf[e - 1]):
+                reason = 2
+            elif n <= 300:
+                reason = 3
+            elif n % 3 != 0:
+                reason = 4
             else:
-                log_file.write(f"{id_}\tFAILED\t{reason}\n")
-    return passed
+                # ATGC_LUT is a global array, so numba bakes it in as a constant table
+                for j in range(s, e):
+                    if ATGC_LUT[buf[j]] == 0:
+                        reason = 5
+                        break
+                if reason == 0:
+                    for j in range(s + 3, e - 3, 3):
+                        if _is_stop(buf[j], buf[j + 1], buf[j + 2]):
+                            reason = 6
+                            pos = j - s + 1
+                            break
+            out_reason[i] = reason
+            out_pos[i] = pos
+
+def qc_batch(seqs):
+    """Run the QC kernel over uppercase seqs; returns (reason codes, stop positions) arrays."""
+    lengths = np.fromiter((len(seq) for seq in seqs), dtype=np.int64, count=len(seqs))
+    offs = np.zeros(len(seqs) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offs[1:])
+    buf = np.frombuffer(b"".join(seqs), dtype=np.uint8)
+    out_reason = np.zeros(len(seqs), dtype=np.int8)
+    out_pos = np.zeros(len(seqs), dtype=np.int64)
+    qc_kernel(buf, offs, out_reason, out_pos)
+    return out_reason, out_pos
+
+def qc_results(records):
+    """Yield (id, seq, failure reason or None) for each (id, uppercase seq) record.
+
+    With numba, records are checked in batches of about QC_BATCH_BASES bases so
+    memory stays bounded; otherwise one at a time with is_valid_sequence.
+    """
+    if njit is None:
+        for id_, seq in records:
+            yield id_, seq, is_valid_sequence(seq)[1]
+        return
+    batch, bases = [], 0
+    for id_, seq in records:
+        batch.append((id_, seq))
+        bases += len(seq)
+        if bases >= QC_BATCH_BASES:
+            yield from qc_checked(batch, bases)
+            batch, bases = [], 0
+    yield from qc_checked(batch, bases)
+
+def qc_checked(batch, bases):
+    """QC one batch of (id, uppercase seq), through the kernel when it is big enough to pay for it."""
+    if bases < JIT_MIN_BASES:
+        for id_, seq in batch:
+            yield id_, seq, is_valid_sequence(seq)[1]
+        return
+    reasons, positions = qc_batch([seq for _, seq in batch])
+    for (id_, seq), code, pos in zip(batch, reasons.tolist(), positions.tolist()):
+        yield id_, seq, QC_REASONS[code].format(pos) if code else None
 
-def remove_length_outliers(sequences):
-    """Removes length outliers using the IQR method."""
-    if not sequences:
-        return {}
+def filter_sequences_by_quality(records, log_file_path):
+    """
+    Applies biological QC checks to (id, uppercase seq) records and logs failures.
+    
+    Yields the (id, seq) records that passed QC.
+    """
+    # Failure lines are built as bytes (the IDs already are) and written in joined batches
+    with open(log_file_path, "wb") as log_file:
+        log_buf = []
+        for id_, seq, reason in qc_results(records):
+            if reason is None:
+                yield id_, seq
+            else:
+                log_buf.append(id_ + b"\tFAILED\t" + reason.encode() + b"\n")
+                if len(log_buf) >= WRITE_BATCH_RECORDS:
+                    log_file.write(b"".join(log_buf))
+                    log_buf.clear()
+        log_file.write(b"".join(log_buf))
 
-    lengths = np.array([len(seq) for seq in sequences.values()])
+def length_inlier_mask(lengths):
+    """Returns a boolean mask of the lengths within the IQR bounds (all True for too few sequences)."""
+    lengths = np.asarray(lengths, dtype=np.int64)
     if len(lengths) < 4:
-        return sequences
+        return np.ones(len(lengths), dtype=bool)
 
     q1, q3 = np.percentile(lengths, [25, 75])
     iqr = q3 - q1
     lower_bound, upper_bound = q1 - 3 * iqr, q3 + 3 * iqr
-
-    return {id_: seq for id_, seq in sequences.items() if lower_bound <= len(seq) <= upper_bound}
+    return (lengths >= lower_bound) & (lengths <= upper_bound)
 
 def process_fasta(input_file, output_passed):
     """
@@ -76,40 +244,67 @@ def process_fasta(input_file, output_passed):
      - Performs biological QC and logs failures.
      - Removes outliers using the Modified Z-score method.
      - Writes the QC-passed sequences in uppercase to the output file.
+    Records are streamed: QC-passed ones go to a temporary file in the first
+    pass, and only their lengths are kept for the outlier bounds.
     """
-    # Check if input file exists and is accessible
-    if not os.path.isfile(input_file):
+    # (id, sequence) byte pairs straight from the mapped file; nothing is decoded.
+    # Opening the input is the existence/access check (no separate stat)
+    records = read_fasta(input_file)
+    try:
+        first = next(records, None)
+    except OSError:
         print(f"Error: Input file {input_file} does not exist or is not accessible.")
         return
 
-    sequences = {record.id: str(record.seq) for record in SeqIO.parse(input_file, "fasta")}
-    
     # Check if sequences were parsed correctly
-    if not sequences:
+    if first is None:
         print(f"Failed QC: {input_file} (No sequences found or unable to parse)")
         return
 
+    # Ensure output directory exists (the log and temporary file are written there too)
+    os.makedirs(os.path.dirname(output_passed) or ".", exist_ok=True)
+
     log_file = output_passed + ".log.txt"
-    
-    # Apply biological QC and log failures
-    filtered_sequences = filter_sequences_by_quality(sequences, log_file)
-    
+    tmp_file = output_passed + ".tmp"
+
+    # Pass 1: apply biological QC and log failures; write passing records as they come
+    lengths, sizes, buf = [], [], []
+    with open(tmp_file, "wb") as tmp:
+        for id_, seq in filter_sequences_by_quality(chain([first], records), log_file):
+            record = b">" + id_ + b"\n" + seq + b"\n"
+            lengths.append(len(seq))
+            sizes.append(len(record))
+            buf.append(record)
+            if len(buf) >= WRITE_BATCH_RECORDS:
+                tmp.write(b"".join(buf))
+                buf.clear()
+        tmp.write(b"".join(buf))
+
     # Remove length outliers using the Modified Z-score method
-    filtered_sequences = remove_length_outliers(filtered_sequences)
+    keep = length_inlier_mask(lengths)
+    kept = int(keep.sum())
+    if kept == len(lengths):
+        os.replace(tmp_file, output_passed)
+    else:
+        # Pass 2: copy the records within bounds; they sit back to back in the temporary file
+        with open(tmp_file, "rb") as tmp, open(output_passed, "wb") as out_f:
+            buf = []
+            for inlier, size in zip(keep.tolist(), sizes):
+                record = tmp.read(size)
+                if inlier:
+                    buf.append(record)
+                    if len(buf) >= WRITE_BATCH_RECORDS:
+                        out_f.write(b"".join(buf))
+                        buf.clear()
+            out_f.write(b"".join(buf))
+        os.remove(tmp_file)
 
     # Check if any sequences pass QC
-    if filtered_sequences:
-        # Ensure output directory exists
-        output_dir = os.path.dirname(output_passed)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        with open(output_passed, "w") as out_f:
-            for id_, seq in filtered_sequences.items():
-                out_f.write(f">{id_}\n{seq}\n")
+    if kept:
         print(f"Passed QC: {input_file} -> {output_passed}")
         print(f"QC log saved to: {log_file}")
     else:
+        os.remove(output_passed)
         print(f"Failed QC: {input_file} (All sequences removed during QC)")
         print(f"QC log saved to: {log_file}")
 
@@ -117,6 +312,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Biological QC filter for FASTA sequences with robust outlier detection.")
     parser.add_argument("input", help="Input FASTA file")
     parser.add_argument("output_passed", help="Output file for QC-passed sequences")
+    parser.add_argument("more", nargs="*", metavar="input output_passed",
+                        help="Further input/output pairs, QC'd in parallel")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="Worker processes when several files are given (default: all cores)")
     args = parser.parse_args()
-    
-    process_fasta(args.input, args.output_passed)
+    if len(args.more) % 2:
+        parser.error("inputs and outputs must come in pairs")
+    inputs = [args.input] + args.more[0::2]
+    outputs = [args.output_passed] + args.more[1::2]
+
+    if len(inputs) == 1 or args.jobs <= 1:
+        for input_file, output_passed in zip(inputs, outputs):
+            process_fasta(input_file, output_passed)
+    else:
+        # Files are independent (each has its own output and log), so one process per file
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(inputs))) as ex:
+            list(ex.map(process_fasta, inputs, outputs))